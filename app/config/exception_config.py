@@ -4,7 +4,8 @@ import logging
 from fastapi.encoders import jsonable_encoder
 from starlette.requests import Request
 from starlette.responses import JSONResponse
-from starlette.status import HTTP_422_UNPROCESSABLE_ENTITY, HTTP_500_INTERNAL_SERVER_ERROR, HTTP_404_NOT_FOUND
+from starlette.status import HTTP_422_UNPROCESSABLE_ENTITY, HTTP_500_INTERNAL_SERVER_ERROR, HTTP_404_NOT_FOUND, \
+    HTTP_412_PRECONDITION_FAILED
 
 logger = logging.getLogger(__name__)
 
@@ -112,3 +113,22 @@ async def data_not_found_error_handler(request, exc):
             _build_error_dict("Not Found Error", str(exc))
         )
     )
+
+
+async def query_budget_error_handler(request, exc):
+    logger.error(str(exc))
+    return JSONResponse(
+        status_code=HTTP_500_INTERNAL_SERVER_ERROR,
+        content=jsonable_encoder(
+            _build_error_dict("Query Budget Exceeded", str(exc))
+        )
+    )
+
+
+async def precondition_failed_handler(request, exc):
+    return JSONResponse(
+        status_code=HTTP_412_PRECONDITION_FAILED,
+        content=jsonable_encoder(
+            _build_error_dict("Precondition Failed", str(exc))
+        )
+    )
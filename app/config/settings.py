@@ -1,6 +1,7 @@
+import os
 from enum import Enum
 from functools import lru_cache
-from typing import Mapping, Any
+from typing import Mapping, Any, List, Literal, Optional, Tuple, Dict
 
 from pydantic import BaseSettings, validator
 from uvicorn.config import LOG_LEVELS
@@ -18,10 +19,41 @@ class DatabaseSettings(BaseSettings):
     password: str = "postgres"
     host: str = "localhost"
     port: int = 5432
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout_seconds: float = 30
+    pool_recycle_seconds: int = 1800
+    pool_pre_ping: bool = True
+    pool_warm_up: bool = True
+    statement_cache_size: int = 100  # asyncpg prepared statements kept per connection, 0 behind pgbouncer
+    prepared_statement_cache_size: int = 100  # sqlalchemy's asyncpg dialect cache per connection
+    replica_urls: List[str] = []  # postgresql+asyncpg:// DSNs, as a JSON list in POSTGRES_DB_REPLICA_URLS
+    replica_selection: Literal["round_robin", "least_busy"] = "round_robin"
+    replica_retry_seconds: int = 30  # how long a replica that failed to connect is skipped
+    read_your_writes_seconds: int = 0  # reads go to the primary this long after a client's write, 0 disables
+    max_connections: Optional[int] = 100  # postgres max_connections shared by all workers, None leaves pools as set
+    reserved_connections: int = 10  # kept free of worker pools for migrations, admin and superuser slots
 
     class Config:
         env_prefix = "POSTGRES_DB_"
 
+    def worker_pool_limits(self, workers: int) -> Tuple[int, int]:
+        """
+        pool_size and max_overflow for each of `workers` processes so their pools together
+        never open more than `max_connections - reserved_connections` connections.
+        Fails when there are more workers than connections, rather than oversubscribing postgres.
+        """
+        if self.max_connections is None:
+            return self.pool_size, self.max_overflow
+        budget = self.max_connections - self.reserved_connections
+        if workers > budget:
+            raise ValueError(f"{workers} workers need at least {workers} connections, "
+                             f"max_connections {self.max_connections} leaves {budget} after "
+                             f"{self.reserved_connections} reserved, lower WORKERS or raise POSTGRES_DB_MAX_CONNECTIONS")
+        per_worker = budget // workers
+        pool_size = min(self.pool_size, per_worker)
+        return pool_size, min(self.max_overflow, per_worker - pool_size)
+
     @property
     def url(self) -> str:
         return f"postgresql://{self.user}:{self.password}@{self.host}:{self.port}/{self.name}"
@@ -39,8 +71,52 @@ class Settings(BaseSettings):
     log_level: str = "debug"
     app_reload: bool = False
     db_retry_window_seconds: int = 60
+    workers: Optional[int] = None  # server processes, the CPU count when unset
+    loop: Literal["auto", "asyncio", "uvloop"] = "auto"  # auto picks uvloop when installed
+    http: Literal["auto", "h11", "httptools"] = "auto"  # auto picks httptools when installed
+    backlog: int = 2048
+    keep_alive_seconds: int = 5
+    limit_concurrency: Optional[int] = None  # connections per worker before answering 503
+    max_requests: int = 0  # requests before a worker is recycled, 0 disables
+    max_requests_jitter: int = 0  # random extra requests so workers don't all restart at once
+    graceful_timeout_seconds: int = 30
+    count_cache_ttl_seconds: int = 30
+    count_cache_max_entries: int = 10_000  # filters are user supplied, least recently used counts go first
+    fast_serialization: bool = True  # order endpoints write rows straight to json bytes, skipping pydantic
+    order_cache_backend: Literal["none", "memory", "redis"] = "none"
+    order_cache_ttl_seconds: int = 300
+    order_cache_max_bytes: int = 64 * 1024 * 1024
+    single_flight_enabled: bool = True  # concurrent identical order reads share one query
+    batch_load_enabled: bool = True  # concurrent lookups by id are batched into one query
+    batch_load_window_ms: float = 0  # how long a batch collects ids, 0 sends it on the next event loop tick
+    batch_load_max_size: int = 500
+    by_ids_max_items: int = 500  # ids accepted by GET /orders/by-ids
+    redis_url: str = "redis://localhost:6379/0"
+    export_fetch_size: int = 1000  # rows fetched per round trip from the export's server-side cursor
+    import_chunk_size: int = 1000  # rows validated and copied into staging at a time
+    import_max_reported_errors: int = 1000
+    slow_query_ms: int = 200  # statements slower than this are logged, 0 disables
+    query_budget_mode: Optional[Literal["off", "warn", "raise"]] = None  # endpoints over their query budget, raise in localdev
+    metrics_enabled: bool = True  # request latency for /metrics, db and pool metrics are always collected
+    server_timing_enabled: Optional[bool] = None  # per-phase Server-Timing response header, on in localdev
+    compression_encodings: List[str] = ["br", "zstd", "gzip"]  # preference order, br and zstd need `-E compression`
+    compression_minimum_size: int = 1024  # bytes, smaller complete responses are sent uncompressed
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    compression_zstd_level: int = 3
+    compression_excluded_paths: List[str] = ["/health"]
+    compression_cache_max_bytes: int = 16 * 1024 * 1024  # compressed bodies by ETag, 0 disables
+    compression_cache_ttl_seconds: int = 3600
+    import_budget_ms: int = 1000  # cold import of app.main allowed by `python -m app.utils.import_profiler`
     otel_service_name: str = None
     otel_exporter_otlp_endpoint: str = None
+    otel_sample_ratio: float = 1.0  # share of new traces recorded, requests with a sampled parent always follow it
+    otel_route_sample_ratios: Dict[str, float] = {}  # path prefix to ratio, the longest prefix wins
+    otel_excluded_paths: List[str] = ["/", "/health", "/metrics"]  # never traced, including sub paths except for /
+    otel_bsp_max_queue_size: int = 2048  # spans dropped past this many waiting for export
+    otel_bsp_max_export_batch_size: int = 512
+    otel_bsp_schedule_delay_ms: int = 5000
+    otel_bsp_export_timeout_ms: int = 30000
 
     ALLOWED_CORS_ORIGINS: set = [
         "localhost",
@@ -66,6 +142,23 @@ class Settings(BaseSettings):
     def init_db_retry_window_seconds(cls, v: int, values: Mapping[str, Any]) -> int:  # noqa
         if values["environment"] == Environment.localdev:
             return 1
+        return v
+
+    @validator("query_budget_mode", always=True)
+    def init_query_budget_mode(cls, v: Optional[str], values: Mapping[str, Any]) -> str:  # noqa
+        if v is None:
+            return "raise" if values["environment"] == Environment.localdev else "off"
+        return v
+
+    @validator("server_timing_enabled", always=True)
+    def init_server_timing_enabled(cls, v: Optional[bool], values: Mapping[str, Any]) -> bool:  # noqa
+        if v is None:
+            return values["environment"] == Environment.localdev
+        return v
+
+    @property
+    def worker_count(self) -> int:
+        return self.workers or os.cpu_count() or 1
 
     @property
     def is_local_dev(self) -> bool:
@@ -0,0 +1,83 @@
+import logging
+import os
+import re
+from typing import List
+
+from app.config.settings import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+_traced_pid = None
+
+
+def tracing_enabled() -> bool:
+    return bool(settings.otel_service_name and settings.otel_exporter_otlp_endpoint)
+
+
+def excluded_urls(paths: List[str]) -> str:
+    """
+    Excluded paths as the comma separated regexes the instrumentation searches full urls with.
+    A path excludes itself and everything below it, "/" only excludes the root.
+    """
+    return ",".join(
+        r"://[^/]+/(\?|$)" if path == "/" else rf"://[^/]+{re.escape(path.rstrip('/'))}(/|\?|$)"
+        for path in paths
+    )
+
+
+def build_tracer_provider(exporter, sample_ratio: float):
+    """
+    Tracer provider sampling new traces per route (`RouteRatioSampler`) while spans with a parent follow it,
+    exporting through a batch span processor tuned by the `otel_bsp_*` settings.
+    """
+    from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased
+
+    from app.utils.trace_sampler import RouteRatioSampler
+
+    resource = Resource(attributes={
+        SERVICE_NAME: settings.otel_service_name or settings.service,
+    })
+    sampler = ParentBased(root=RouteRatioSampler(sample_ratio, settings.otel_route_sample_ratios))
+    provider = TracerProvider(resource=resource, sampler=sampler)
+    provider.add_span_processor(BatchSpanProcessor(
+        exporter,
+        max_queue_size=settings.otel_bsp_max_queue_size,
+        max_export_batch_size=settings.otel_bsp_max_export_batch_size,
+        schedule_delay_millis=settings.otel_bsp_schedule_delay_ms,
+        export_timeout_millis=settings.otel_bsp_export_timeout_ms,
+    ))
+    return provider
+
+
+def setup_tracing(application) -> None:
+    """
+    Exports spans from the current process. The batch span processor runs a background thread and the
+    OTLP exporter holds a gRPC channel, neither survives a fork, so each worker sets up its own provider
+    when it creates the application instead of inheriting one from the server process.
+    OpenTelemetry is only imported here once tracing is enabled, it adds a lot to every cold start otherwise.
+    """
+    global _traced_pid
+    if not tracing_enabled():
+        logger.info("OpenTelemetry trace/span exports are disabled")
+        return
+
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+
+    if _traced_pid != os.getpid():
+        _traced_pid = os.getpid()
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+
+        from app.utils import db_session
+
+        exporter = OTLPSpanExporter(endpoint=settings.otel_exporter_otlp_endpoint)
+        trace.set_tracer_provider(build_tracer_provider(exporter, settings.otel_sample_ratio))
+        SQLAlchemyInstrumentor().instrument(
+            engines=[db_session.engine.sync_engine] + [replica.sync_engine for replica in db_session.replicas.engines]
+        )
+
+    FastAPIInstrumentor.instrument_app(application, excluded_urls=excluded_urls(settings.otel_excluded_paths))
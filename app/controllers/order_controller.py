@@ -1,14 +1,24 @@
-from typing import List
+from typing import List, Any, Dict, Literal, Optional
 
-from fastapi import Depends, APIRouter
+import orjson
+from fastapi import Depends, APIRouter, Body, UploadFile, File, Query, Header
+from pydantic import ValidationError
+from starlette.responses import Response, StreamingResponse
 from fastapi_restful.cbv import cbv
-from starlette.status import HTTP_201_CREATED, HTTP_204_NO_CONTENT
+from starlette.status import HTTP_201_CREATED, HTTP_204_NO_CONTENT, HTTP_304_NOT_MODIFIED
 
-from app.models.order import OrderSchema, OrderOrm
+from app.config.settings import get_settings
+from app.models.batch import BatchResponseSchema, BatchItemResultSchema, BatchItemErrorSchema, ImportResponseSchema, \
+    ByIdsResponseSchema
+from app.models.order import OrderSchema, OrderOrm, OrderFilterSchema, OrderPatchSchema
 from app.models.pageable import PageRequestSchema, PageResponseSchema
 from app.services.order_service import OrderService
+from app.utils import server_timing
+from app.utils.etag import entity_etag, page_etag, none_match
+from app.utils.query_stats import query_budget
 
 order_router = APIRouter()
+settings = get_settings()
 
 
 @cbv(order_router)
@@ -17,31 +27,139 @@ class OrderController:
         self.order_service = OrderService()
 
     @order_router.post("/order", status_code=HTTP_201_CREATED, operation_id="create_order_post")
+    @query_budget(2)
     async def create_order(self, order: OrderSchema) -> OrderSchema:
         order_orm: OrderOrm = order.to_orm()  # convert pydantic to sqlalchemy
 
         return await self.order_service.create_order(order_orm)
 
+    @order_router.post("/orders/batch", status_code=HTTP_201_CREATED, operation_id="create_orders_batch_post")
+    async def create_orders(self, orders: List[Dict[str, Any]] = Body(...)) -> BatchResponseSchema:
+        # items are validated one by one so a bad item is reported without rejecting the whole batch
+        items: List[BatchItemResultSchema] = []
+        valid: List[OrderSchema] = []
+        for index, item in enumerate(orders):
+            try:
+                valid.append(OrderSchema.parse_obj(item))
+                items.append(BatchItemResultSchema(index=index))
+            except ValidationError as e:
+                errors = [BatchItemErrorSchema(source="/".join(map(str, error["loc"])), msg=error["msg"])
+                          for error in e.errors()]
+                items.append(BatchItemResultSchema(index=index, errors=errors))
+
+        ids = iter(await self.order_service.create_orders(valid) if valid else [])
+        for item in items:
+            if item.errors is None:
+                item.id = next(ids)
+
+        return BatchResponseSchema(created_count=len(valid), error_count=len(items) - len(valid), items=items)
+
+    @order_router.post("/orders/import", operation_id="import_orders_post")
+    async def import_orders(self, file: UploadFile = File(...),
+                            format: Optional[Literal["ndjson", "csv"]] = None) -> ImportResponseSchema:
+        # multipart uploads are spooled to a temporary file, the service reads it back a chunk at a time
+        if format is None:
+            is_csv = file.content_type == "text/csv" or (file.filename or "").endswith(".csv")
+            format = "csv" if is_csv else "ndjson"
+        return await self.order_service.import_orders(file.file, format)
+
     @order_router.get("/order/{order_id}", operation_id="retrieve_order_get")
-    async def retrieve_order(self, order_id: int) -> OrderSchema:
-        return await self.order_service.get_order(order_id)
+    @query_budget(2)
+    async def retrieve_order(self, order_id: int, response: Response,
+                             if_none_match: Optional[str] = Header(None)) -> OrderSchema:
+        if if_none_match is not None:
+            # probe the version first, a client polling an unchanged order costs no joins and no serialization
+            etag = await self.order_service.get_order_etag(order_id)
+            if not none_match(if_none_match, etag):
+                return Response(status_code=HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        if settings.fast_serialization:
+            etag, order = await self.order_service.get_order_json(order_id)
+            return Response(order, media_type="application/json", headers={"ETag": etag})
+        order = await self.order_service.get_order(order_id)
+        response.headers["ETag"] = entity_etag(order.id, order.updated_at)
+        return order
 
     @order_router.get("/order/address/{address_id}", operation_id="retrieve_order_by_address_get")
+    @query_budget(1)
     async def retrieve_order_by_address(self, address_id: int) -> OrderSchema:
         return await self.order_service.get_order_by_address_id(address_id)
 
     @order_router.put("/order/{order_id}", operation_id="update_order_put")
-    async def update_order(self, order_id: int, order: OrderSchema) -> OrderSchema:
-        order_orm: OrderOrm = order.to_orm()  # convert pydantic to sqlalchemy
+    @query_budget(1)
+    async def update_order(self, order_id: int, order: OrderSchema, response: Response,
+                           if_match: Optional[str] = Header(None)) -> OrderSchema:
+        order_orm = await self.order_service.update_order(order_id, order, if_match)
+        response.headers["ETag"] = entity_etag(order_orm.id, order_orm.updated_at)
+        return order_orm
 
-        return await self.order_service.update_order(order_id, order_orm)
+    @order_router.patch("/order/{order_id}", operation_id="patch_order_patch")
+    @query_budget(5)  # 3 when the order has both addresses, each address it lacks is one more insert
+    async def patch_order(self, order_id: int, order: OrderPatchSchema, response: Response,
+                          if_match: Optional[str] = Header(None)) -> OrderSchema:
+        order_orm = await self.order_service.patch_order(order_id, order, if_match)
+        response.headers["ETag"] = entity_etag(order_orm.id, order_orm.updated_at)
+        return order_orm
 
     @order_router.delete("/order/{order_id}", operation_id="delete_order_delete", status_code=HTTP_204_NO_CONTENT)
-    async def delete_order(self, order_id: int):
-        await self.order_service.delete_order(order_id)
+    @query_budget(1)
+    async def delete_order(self, order_id: int, if_match: Optional[str] = Header(None)):
+        await self.order_service.delete_order(order_id, if_match)
 
     @order_router.get("/orders", operation_id="list_orders_get")
-    async def list_orders(self, pageable: PageRequestSchema = Depends()) -> PageResponseSchema:
-        data, total_count = await self.order_service.get_paged_orders(pageable)
-        pydantic_orders = [OrderSchema.from_orm(orm) for orm in data]  # needed to serialize correctly
-        return PageResponseSchema(total_count=total_count, page_size=pageable.size, data=pydantic_orders)
+    @query_budget(3)
+    async def list_orders(self, response: Response, pageable: PageRequestSchema = Depends(),
+                          filters: OrderFilterSchema = Depends(),
+                          if_none_match: Optional[str] = Header(None)) -> PageResponseSchema:
+        page = await self.order_service.get_paged_orders(pageable, filters)
+        return self._page_response(page, response, if_none_match)
+
+    @order_router.get("/orders/by-ids", operation_id="list_orders_by_ids_get")
+    @query_budget(1)
+    async def list_orders_by_ids(self, ids: List[int] = Query(..., min_items=1, max_items=settings.by_ids_max_items)
+                                 ) -> ByIdsResponseSchema:
+        orders, missing_ids = await self.order_service.get_orders_by_ids(ids)
+        if settings.fast_serialization:
+            with server_timing.timed("serialize"):
+                content = {"data": [OrderSchema.dump_orm(orm) for orm in orders], "missing_ids": missing_ids}
+            with server_timing.timed("encode"):
+                body = orjson.dumps(content)
+            return Response(body, media_type="application/json")
+        with server_timing.timed("serialize"):
+            data = [OrderSchema.from_orm_fast(orm) for orm in orders]
+        return ByIdsResponseSchema(data=data, missing_ids=missing_ids)
+
+    @order_router.get("/orders/export", operation_id="export_orders_get")
+    async def export_orders(self, format: Literal["ndjson", "csv"] = "ndjson",
+                            filters: OrderFilterSchema = Depends()) -> StreamingResponse:
+        media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+        return StreamingResponse(
+            self.order_service.export_orders(format, filters),
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="orders.{format}"'},
+        )
+
+    @order_router.get("/orders/address/{address_id}", operation_id="list_orders_by_address_get")
+    @query_budget(3)
+    async def list_orders_by_address(self, address_id: int, response: Response,
+                                     pageable: PageRequestSchema = Depends(),
+                                     if_none_match: Optional[str] = Header(None)) -> PageResponseSchema:
+        page = await self.order_service.get_paged_orders_by_address_id(address_id, pageable)
+        return self._page_response(page, response, if_none_match)
+
+    @staticmethod
+    def _page_response(page: PageResponseSchema, response: Response, if_none_match: Optional[str]):
+        # weak, two pages with the same rows and totals are equivalent even if their bytes were to differ
+        etag = page_etag(page.data, page.total_count, page.has_next, page.next_cursor, page.prev_cursor)
+        if not none_match(if_none_match, etag):
+            return Response(status_code=HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        if settings.fast_serialization:
+            content = {key: getattr(page, key) for key in page.__fields__}
+            with server_timing.timed("serialize"):
+                content["data"] = [OrderSchema.dump_orm(orm) for orm in page.data]
+            with server_timing.timed("encode"):
+                body = orjson.dumps(content)
+            return Response(body, media_type="application/json", headers={"ETag": etag})
+        with server_timing.timed("serialize"):
+            page.data = [OrderSchema.from_orm_fast(orm) for orm in page.data]  # needed to serialize correctly
+        return page
@@ -1,7 +1,12 @@
 from fastapi import status, APIRouter
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi_restful.cbv import cbv
 
+from app.services.order_service import get_order_cache, order_reads
+from app.utils import db_session
+from app.utils.batch_loader import loader_stats
+from app.utils.metrics import registry
+
 system_router = APIRouter()
 
 
@@ -17,3 +22,25 @@ class SystemController:
     async def healthcheck(self) -> JSONResponse:
         data = {"fast-api-docker-poetry": status.HTTP_200_OK}
         return JSONResponse(data, status_code=status.HTTP_200_OK)
+
+    @system_router.get("/health/pool", include_in_schema=False)
+    async def pool_stats(self) -> dict:
+        return db_session.pool_stats()
+
+    @system_router.get("/health/cache", include_in_schema=False)
+    async def cache_stats(self) -> dict:
+        order_cache = get_order_cache()
+        return {"order": order_cache.stats() if order_cache else None}
+
+    @system_router.get("/health/single-flight", include_in_schema=False)
+    async def single_flight_stats(self) -> dict:
+        return {order_reads.name: order_reads.stats()}
+
+    @system_router.get("/health/batch-loader", include_in_schema=False)
+    async def batch_loader_stats(self) -> dict:
+        return loader_stats()
+
+    @system_router.get("/metrics", include_in_schema=False)
+    async def metrics(self) -> PlainTextResponse:
+        """Prometheus text format, per worker process"""
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
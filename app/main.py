@@ -1,6 +1,6 @@
-import psycopg2
 from fastapi import FastAPI
 from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse
 from httpx import HTTPError
 from pydantic import ValidationError
 from sqlalchemy.exc import IntegrityError, ProgrammingError, NoResultFound
@@ -8,10 +8,19 @@ from starlette.exceptions import HTTPException
 
 from app.config import exception_config as exh
 from app.config.settings import Environment, get_settings, get_database_settings
+from app.config.tracing_config import setup_tracing
 from app.controllers.order_controller import order_router
 from app.controllers.system_controller import system_router
 from app.controllers.test_controller import test_router
+from app.middleware.compression_middleware import CompressionMiddleware
+from app.middleware.metrics_middleware import MetricsMiddleware
+from app.middleware.query_stats_middleware import QueryStatsMiddleware
+from app.middleware.server_timing_middleware import ServerTimingMiddleware
+from app.middleware.unit_of_work_middleware import UnitOfWorkMiddleware
+from app.repository.order_repository import OrderRepository
 from app.utils import db_session
+from app.utils.etag import PreconditionFailedError
+from app.utils.query_stats import QueryBudgetExceededError
 
 settings = get_settings()
 
@@ -20,6 +29,7 @@ def create_application() -> FastAPI:
     application = FastAPI(
         title="Fast Api Docker Poetry Docs",
         debug=False,
+        default_response_class=ORJSONResponse,
     )
 
     if settings.environment == Environment.prod:
@@ -34,6 +44,17 @@ def create_application() -> FastAPI:
     application.add_exception_handler(ProgrammingError, exh.sql_error_handler)
     application.add_exception_handler(HTTPError, exh.http_error_handler)
     application.add_exception_handler(HTTPException, exh.http_exception_handler)
+    application.add_exception_handler(QueryBudgetExceededError, exh.query_budget_error_handler)
+    application.add_exception_handler(PreconditionFailedError, exh.precondition_failed_handler)
+
+    application.add_middleware(UnitOfWorkMiddleware)
+    if settings.server_timing_enabled:
+        application.add_middleware(ServerTimingMiddleware)  # inside QueryStatsMiddleware, it reads the db time
+    application.add_middleware(QueryStatsMiddleware)
+    if settings.metrics_enabled:
+        application.add_middleware(MetricsMiddleware)
+    if settings.compression_encodings:
+        application.add_middleware(CompressionMiddleware)
 
     application.include_router(system_router)
     application.include_router(order_router)
@@ -44,18 +65,17 @@ def create_application() -> FastAPI:
     @application.on_event("startup")
     async def initialize():
         print(f"Connecting to postgres...")
-        dsn = get_database_settings().url
-        conn = psycopg2.connect(dsn)
-        cur = conn.cursor()
-        cur.execute("SELECT 1;")
-        cur.close()
-        conn.close()
+        await db_session.wait_until_ready(settings.db_retry_window_seconds)
         print(f"Successfully connected to postgres...")
+        if get_database_settings().pool_warm_up:
+            await db_session.warm_up(OrderRepository().warm_up_statements())
 
     @application.on_event("shutdown")
     async def shutdown():
         await db_session.shutdown()
 
+    setup_tracing(application)  # last, so the tracing middleware wraps every other middleware
+
     return application
 
 
@@ -69,5 +89,10 @@ if __name__ == "__main__":
         port=settings.port,
         log_level=settings.log_level,
         access_log=True,
-        reload=settings.app_reload,  # has to be false for tracing to work
+        reload=settings.app_reload,
+        loop=settings.loop,
+        http=settings.http,
+        backlog=settings.backlog,
+        timeout_keep_alive=settings.keep_alive_seconds,
+        limit_concurrency=settings.limit_concurrency,
     )
@@ -0,0 +1,117 @@
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Scope, Receive, Send, Message
+
+from app.config.settings import get_settings
+from app.utils.cache import MemoryCache
+from app.utils.compression import build_codecs, negotiate, Codec
+from app.utils.etag import coded_etag
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+class CompressionMiddleware:
+    """
+    Compresses response bodies with the best encoding both sides support (`compression_encodings`).
+    Complete bodies under `compression_minimum_size` and paths in `compression_excluded_paths` are sent as they are.
+    Streamed bodies, like the export, are compressed chunk by chunk without buffering.
+
+    Compressed bodies of 200 responses with a strong ETag are kept in a bounded cache, so a popular order
+    is compressed once per version. Strong ETags of compressed bodies get the coding as a suffix (`coded_etag`),
+    since a strong tag promises the same bytes. Weak ETags are left as they are.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        settings = get_settings()
+        self.codecs = build_codecs(settings.compression_encodings, settings.compression_gzip_level,
+                                   settings.compression_brotli_quality, settings.compression_zstd_level)
+        self.minimum_size = settings.compression_minimum_size
+        self.excluded_paths = tuple(settings.compression_excluded_paths)
+        self.cache = MemoryCache("compressed", settings.compression_cache_ttl_seconds,
+                                 settings.compression_cache_max_bytes) if settings.compression_cache_max_bytes else None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] == "HEAD" or scope["path"].startswith(self.excluded_paths):
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        codec = negotiate(request_headers.get("accept-encoding"), self.codecs)
+        start: Optional[Message] = None
+        passthrough = False
+        stream = None
+
+        async def send_wrapper(message: Message):
+            nonlocal start, passthrough, stream
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                if (message["status"] in (204, 304) or "content-encoding" in headers
+                        or not content_type.startswith(COMPRESSIBLE_TYPES)):
+                    passthrough = True
+                    if message["status"] == 304 and codec is not None:
+                        self._match_coded_etag(message, codec, request_headers.get("if-none-match", ""))
+                    await send(message)
+                else:
+                    MutableHeaders(raw=message["headers"]).add_vary_header("Accept-Encoding")
+                    start = message  # held back until the first body chunk tells whether and how to compress
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if stream is not None:
+                body = stream.compress(body) if more_body else stream.compress(body) + stream.finish()
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                return
+
+            headers = MutableHeaders(raw=start["headers"])
+            if codec is None or (not more_body and len(body) < self.minimum_size):
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            headers["content-encoding"] = codec.encoding
+            etag = headers.get("etag")
+            if etag is not None and not etag.startswith("W/"):
+                headers["etag"] = coded_etag(etag, codec.encoding)
+            if more_body:
+                del headers["content-length"]
+                stream = codec.stream()
+                await send(start)
+                await send({"type": "http.response.body", "body": stream.compress(body), "more_body": True})
+                return
+
+            body = await self._compress(codec, body, scope, start["status"], etag)
+            headers["content-length"] = str(len(body))
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _match_coded_etag(message: Message, codec: Codec, if_none_match: str) -> None:
+        """
+        A 304 carries the ETag of the version, the client's copy may be the compressed one it was sent.
+        """
+        headers = MutableHeaders(raw=message["headers"])
+        etag = headers.get("etag")
+        if etag is not None and not etag.startswith("W/") and coded_etag(etag, codec.encoding) in if_none_match:
+            headers["etag"] = coded_etag(etag, codec.encoding)
+
+    async def _compress(self, codec: Codec, body: bytes, scope: Scope, status: int, etag: Optional[str]) -> bytes:
+        if self.cache is None or status != 200 or etag is None or etag.startswith("W/"):
+            return codec.compress(body)
+        # the same version can be rendered differently by different endpoints, so the request is part of the key
+        key = f"{codec.encoding} {scope['method']} {scope['path']}?{scope['query_string'].decode()} {etag}"
+        compressed = await self.cache.get(key)
+        if compressed is None:
+            compressed = codec.compress(body)
+            await self.cache.set(key, compressed)
+        return compressed
@@ -0,0 +1,46 @@
+import time
+from typing import Dict
+
+from starlette.types import ASGIApp, Scope, Receive, Send
+
+from app.utils.metrics import registry, Histogram
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "Time to handle a request, by route operation id", ["operation_id"]
+)
+http_requests_in_flight = registry.gauge("http_requests_in_flight", "Requests being handled").labels()
+
+
+class MetricsMiddleware:
+    """
+    Records request latency per route in `http_request_duration_seconds` and the requests in flight.
+    The histogram of each route is looked up once and kept, so a request costs two gauge updates and one observe.
+    Requests that match no route are recorded as "unmatched" to keep label values bounded.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._route_histograms: Dict[object, Histogram] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            http_requests_in_flight.dec()
+            self._histogram(scope).observe(time.perf_counter() - start)
+
+    def _histogram(self, scope: Scope) -> Histogram:
+        # routes are not hashable, their endpoint functions are and are unique per route
+        endpoint = scope.get("endpoint")
+        histogram = self._route_histograms.get(endpoint)
+        if histogram is None:
+            route = scope.get("route")
+            operation_id = getattr(route, "operation_id", None) or getattr(route, "name", None) or "unmatched"
+            histogram = self._route_histograms[endpoint] = http_request_duration.labels(operation_id)
+        return histogram
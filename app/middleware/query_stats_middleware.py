@@ -0,0 +1,28 @@
+import logging
+
+from starlette.types import ASGIApp, Scope, Receive, Send
+
+from app.utils.query_stats import track_queries
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStatsMiddleware:
+    """
+    Counts the statements each request executes and the time spent in them (`current_query_stats()`),
+    and logs the totals at debug level.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as stats:
+            await self.app(scope, receive, send)
+        if stats.count and logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"{scope['method']} {scope['path']} executed {stats.count} queries "
+                         f"in {stats.duration * 1000:.1f}ms")
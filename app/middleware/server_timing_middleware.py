@@ -0,0 +1,38 @@
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Scope, Receive, Send, Message
+
+from app.utils.query_stats import current_query_stats
+from app.utils.server_timing import collect_server_timing
+
+
+class ServerTimingMiddleware:
+    """
+    Adds a W3C `Server-Timing` header breaking the request down into pool checkout, SQL execution (db),
+    ORM hydration, schema serialization and JSON encoding, plus the total time until the response started.
+    Phases are recorded by `server_timing.timed` blocks in the repository, service and controller layers,
+    db time comes from the request's query stats, so this has to run inside `QueryStatsMiddleware`.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        query_stats = current_query_stats()
+        with collect_server_timing() as timing:
+            async def send_wrapper(message: Message):
+                if message["type"] == "http.response.start":
+                    metrics = [f"{phase};dur={seconds * 1000:.2f}" for phase, seconds in timing.durations.items()]
+                    if query_stats is not None:
+                        metrics.insert(1, f'db;dur={query_stats.duration * 1000:.2f};desc="{query_stats.count} queries"')
+                    metrics.append(f"total;dur={(time.perf_counter() - start) * 1000:.2f}")
+                    MutableHeaders(scope=message).append("server-timing", ", ".join(metrics))
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
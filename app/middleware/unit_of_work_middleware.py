@@ -0,0 +1,55 @@
+import time
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import cookie_parser
+from starlette.types import ASGIApp, Scope, Receive, Send, Message
+
+from app.config.settings import get_database_settings
+from app.utils import db_session
+
+READ_ONLY_METHODS = {"GET", "HEAD", "OPTIONS"}
+READ_YOUR_WRITES_COOKIE = "read_your_writes"
+
+
+class UnitOfWorkMiddleware:
+    """
+    Runs each HTTP request inside one `db_session.unit_of_work()`.
+    The transaction is committed just before the response starts (rolled back on 4xx/5xx or an exception),
+    so clients never see a success for a write that did not commit.
+
+    Writes and, when `read_your_writes_seconds` is set, reads from a client that wrote recently
+    (tracked with a cookie) are kept on the primary instead of the read replicas.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.read_your_writes_seconds = get_database_settings().read_your_writes_seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        is_write = scope["method"] not in READ_ONLY_METHODS
+        async with db_session.unit_of_work(prefer_primary=is_write or self._wrote_recently(scope)) as uow:
+            async def send_wrapper(message: Message):
+                if message["type"] == "http.response.start":
+                    success = message["status"] < 400
+                    if success and is_write and uow.session is not None and self.read_your_writes_seconds:
+                        expires_at = int(time.time()) + self.read_your_writes_seconds
+                        MutableHeaders(scope=message).append(
+                            "set-cookie",
+                            f"{READ_YOUR_WRITES_COOKIE}={expires_at}; Max-Age={self.read_your_writes_seconds}; "
+                            f"Path=/; HttpOnly; SameSite=Lax",
+                        )
+                    await uow.complete(commit=success)
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+    def _wrote_recently(self, scope: Scope) -> bool:
+        if not self.read_your_writes_seconds:
+            return False
+        cookie = Headers(scope=scope).get("cookie")
+        expires_at = cookie_parser(cookie).get(READ_YOUR_WRITES_COOKIE) if cookie else None
+        return expires_at is not None and expires_at.isdigit() and int(expires_at) > time.time()
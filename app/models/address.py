@@ -7,7 +7,7 @@ from sqlalchemy import (
     Float,
 )
 
-from app.models.base import BaseOrm, BaseSchema
+from app.models.base import BaseOrm, BaseSchema, PatchSchema
 
 
 class AddressOrm(BaseOrm):
@@ -15,10 +15,10 @@ class AddressOrm(BaseOrm):
 
     address_1 = Column(String)
     address_2 = Column(String)
-    city = Column(String)
+    city = Column(String, index=True)
     state_province = Column(String)
     country = Column(String)
-    postal_code = Column(String)
+    postal_code = Column(String, index=True)
     timezone = Column(String)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
@@ -36,3 +36,17 @@ class AddressSchema(BaseSchema):
     timezone: Optional[str]
     latitude: float
     longitude: float
+
+
+class AddressPatchSchema(PatchSchema):
+    __not_nullable__ = ["postal_code", "latitude", "longitude"]
+
+    address_1: Optional[str]
+    address_2: Optional[str]
+    city: Optional[str]
+    state_province: Optional[str]
+    country: Optional[str]
+    postal_code: Optional[constr(min_length=5, max_length=10)]
+    timezone: Optional[str]
+    latitude: Optional[float]
+    longitude: Optional[float]
@@ -1,9 +1,10 @@
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Dict, List, Tuple, Type
 
 import sqlalchemy as sa
-from pydantic import BaseModel
+from pydantic import BaseModel, validator
 from pydantic import Field
+from pydantic.fields import SHAPE_SINGLETON
 from sqlalchemy import Column, DateTime, BigInteger
 from sqlalchemy import MetaData
 from sqlalchemy.orm import declarative_base
@@ -31,13 +32,14 @@ class BaseOrm(Base):
 
     __abstract__ = True
     __table_args__ = {"extend_existing": True}
+    __mapper_args__ = {"eager_defaults": True}  # read server generated timestamps back with RETURNING on flush
 
     id = Column(BigInteger, primary_key=True, autoincrement=True, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=sa.text("CURRENT_TIMESTAMP"), nullable=False)
     updated_at = Column(
         DateTime(timezone=True),
         nullable=False,
-        onupdate=datetime.utcnow(),
+        onupdate=sa.func.now(),
         server_default=sa.text("CURRENT_TIMESTAMP"),
     )
 
@@ -58,22 +60,140 @@ class BaseSchema(BaseModel):
             raise NotImplementedError("Error __orm__ class not set")
 
         orm = self.__orm__()
+        for key, nested, many in _conversion_plan(type(self)).orm_fields:
+            value = getattr(self, key)
+            if value is None:
+                continue
+            if nested is not None:
+                value = [item.to_orm() for item in value] if many else value.to_orm()
+            setattr(orm, key, value)
 
-        def set_val(key, data):
-            if (isinstance(data, BaseOrm) or isinstance(data, list)) and key not in self.__transient_fields__:
-                setattr(orm, key, data)
+        return orm
+
+    @classmethod
+    def from_orm_fast(cls, orm):
+        """
+        Like `from_orm` but builds the model with `construct`, skipping validation of data already stored in the db.
+        """
+        if orm is None:
+            return None
+
+        values = {}
+        for key, nested, many in _conversion_plan(cls).fields:
+            value = getattr(orm, key, None)
+            if nested is not None and value is not None:
+                value = [nested.from_orm_fast(item) for item in value] if many else nested.from_orm_fast(value)
+            values[key] = value
+        return cls.construct(**values)
+
+    @classmethod
+    def dump_orm(cls, orm) -> Optional[dict]:
+        """
+        Reads the schema's fields straight off an ORM object into a json-ready dict,
+        without validating or constructing pydantic models. Nested schemas are dumped the same way.
+        """
+        if orm is None:
+            return None
+
+        data = {}
+        for key, nested, many in _conversion_plan(cls).fields:
+            value = getattr(orm, key, None)
+            if nested is not None and value is not None:
+                value = [nested.dump_orm(item) for item in value] if many else nested.dump_orm(value)
+            data[key] = value
+        return data
+
+    @classmethod
+    def flat_columns(cls) -> List[str]:
+        """
+        Column names for flat formats like CSV, fields of nested schemas are prefixed with `<field>.`
+        """
+        columns = []
+        for key, nested, many in _conversion_plan(cls).fields:
+            if nested is not None and not many:
+                columns.extend(f"{key}.{column}" for column in nested.flat_columns())
             else:
-                for key, value in data:
-                    try:
-                        if isinstance(value, list):
-                            set_val(key, [item.to_orm() for item in value if isinstance(item, BaseSchema)])
-                        elif isinstance(value, BaseSchema) and key not in self.__transient_fields__:
-                            setattr(orm, key, value.to_orm())
-                        elif value is not None and key not in self.__transient_fields__:
-                            setattr(orm, key, value)
-                    except AttributeError as e:
-                        pass
-
-        set_val(None, self)
+                columns.append(key)
+        return columns
 
-        return orm
+    @classmethod
+    def flatten(cls, data: dict) -> dict:
+        """
+        Flattens a dict shaped like the schema (e.g. from `dump_orm`) into `flat_columns`
+        """
+        flat = {}
+        for key, nested, many in _conversion_plan(cls).fields:
+            value = data.get(key)
+            if nested is not None and not many:
+                nested_flat = nested.flatten(value or {})
+                flat.update({f"{key}.{column}": nested_value for column, nested_value in nested_flat.items()})
+            else:
+                flat[key] = value
+        return flat
+
+    @classmethod
+    def unflatten(cls, row: dict) -> dict:
+        """
+        Inverse of `flatten`. Empty strings are read as missing values and a nested schema
+        with no values at all as a missing nested object.
+        """
+        data = {}
+        for key, nested, many in _conversion_plan(cls).fields:
+            if nested is not None and not many:
+                prefix = f"{key}."
+                nested_row = {column[len(prefix):]: value for column, value in row.items() if column.startswith(prefix)}
+                nested_data = nested.unflatten(nested_row)
+                data[key] = nested_data if any(value is not None for value in nested_data.values()) else None
+            else:
+                value = row.get(key)
+                data[key] = None if value == "" else value
+        return data
+
+
+class PatchSchema(BaseModel):
+    """
+    Partial update body, only the fields present in the request are applied.
+    Fields listed in `__not_nullable__` may be left out but not set to null.
+    """
+
+    __not_nullable__: List[str] = []
+
+    @validator("*")
+    def not_nullable(cls, v, field):  # noqa
+        if v is None and field.name in cls.__not_nullable__:
+            raise ValueError("none is not an allowed value")
+        return v
+
+    def changes(self) -> dict:
+        return self.dict(exclude_unset=True)
+
+
+class ConversionPlan:
+    """
+    Schema field to ORM attribute mapping for one schema class, resolved once on first use
+    so conversions don't re-inspect fields, types and `__transient_fields__` on every call.
+    Each entry is (field name, nested schema class or None, whether the field is a list).
+    """
+
+    def __init__(self, schema: Type[BaseSchema]):
+        self.fields: List[Tuple[str, Optional[Type[BaseSchema]], bool]] = []
+        for key, field in schema.__fields__.items():
+            nested = field.type_ if isinstance(field.type_, type) and issubclass(field.type_, BaseSchema) else None
+            self.fields.append((key, nested, field.shape != SHAPE_SINGLETON))
+
+        self.orm_fields: List[Tuple[str, Optional[Type[BaseSchema]], bool]] = []
+        if schema.__orm__ is not None:
+            transient_fields = frozenset(schema.__transient_fields__)
+            orm_attributes = frozenset(sa.inspect(schema.__orm__).attrs.keys())
+            self.orm_fields = [entry for entry in self.fields
+                               if entry[0] not in transient_fields and entry[0] in orm_attributes]
+
+
+_conversion_plans: Dict[Type[BaseSchema], ConversionPlan] = {}
+
+
+def _conversion_plan(schema: Type[BaseSchema]) -> ConversionPlan:
+    plan = _conversion_plans.get(schema)
+    if plan is None:
+        plan = _conversion_plans[schema] = ConversionPlan(schema)
+    return plan
@@ -0,0 +1,37 @@
+from typing import List, Optional, Any
+
+from pydantic import BaseModel
+
+
+class BatchItemErrorSchema(BaseModel):
+    source: str
+    msg: str
+
+
+class BatchItemResultSchema(BaseModel):
+    index: int
+    id: Optional[int] = None
+    errors: Optional[List[BatchItemErrorSchema]] = None
+
+
+class BatchResponseSchema(BaseModel):
+    created_count: int
+    error_count: int
+    items: List[BatchItemResultSchema]
+
+
+class ImportRowErrorSchema(BaseModel):
+    line: int
+    source: str
+    msg: str
+
+
+class ImportResponseSchema(BaseModel):
+    accepted_count: int = 0
+    rejected_count: int = 0
+    errors: List[ImportRowErrorSchema] = []  # the first `import_max_reported_errors` rejected rows
+
+
+class ByIdsResponseSchema(BaseModel):
+    data: List[Any]  # in the order the ids were requested, duplicates once
+    missing_ids: List[int]
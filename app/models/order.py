@@ -1,27 +1,44 @@
 import random
 import string
+from datetime import datetime
 from typing import Optional
 
+from pydantic import Field
 from sqlalchemy import (
     Column,
     String,
     Float,
-    ForeignKey, BigInteger,
+    ForeignKey, BigInteger, Index,
 )
 from sqlalchemy.orm import relationship
 
-from app.models.address import AddressOrm, AddressSchema
-from app.models.base import BaseOrm, BaseSchema
+from app.models.address import AddressOrm, AddressSchema, AddressPatchSchema
+from app.models.base import BaseOrm, BaseSchema, PatchSchema
+from app.models.pageable import FilterSchema
+
+
+def generate_order_number() -> str:
+    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
 
 
 class OrderOrm(BaseOrm):
     __tablename__ = "orders"
+    __table_args__ = (
+        # (sort, id) pairs back every sortable column for both offset and keyset paging
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_updated_at_id", "updated_at", "id"),
+        Index("ix_orders_price_id", "price", "id"),
+        Index("ix_orders_name_id", "name", "id"),
+        # LIKE 'prefix%' can only use a btree index with pattern ops outside the C collation
+        Index("ix_orders_name_pattern", "name", postgresql_ops={"name": "text_pattern_ops"}),
+        BaseOrm.__table_args__,
+    )
 
-    order_number = Column(String, default=lambda: ''.join(random.choices(string.ascii_uppercase + string.digits, k=6)))
+    order_number = Column(String, default=generate_order_number)
     name = Column(String)
     price = Column(Float)
-    pickup_id = Column(BigInteger, ForeignKey("addresses.id"))
-    dropoff_id = Column(BigInteger, ForeignKey("addresses.id"))
+    pickup_id = Column(BigInteger, ForeignKey("addresses.id"), index=True)
+    dropoff_id = Column(BigInteger, ForeignKey("addresses.id"), index=True)
 
     pickup_address = relationship(AddressOrm, foreign_keys="OrderOrm.pickup_id", lazy="joined", cascade="all,delete")
     dropoff_address = relationship(AddressOrm, foreign_keys="OrderOrm.dropoff_id", lazy="joined", cascade="all,delete")
@@ -36,3 +53,30 @@ class OrderSchema(BaseSchema):
     pickup_address: Optional[AddressSchema]
     dropoff_address: Optional[AddressSchema]
 
+
+class OrderPatchSchema(PatchSchema):
+    """
+    Nested addresses update the order's existing pickup and dropoff addresses in place,
+    an address the order doesn't have yet is created and must then be complete.
+    """
+
+    __not_nullable__ = ["price", "pickup_address", "dropoff_address"]
+
+    name: Optional[str]
+    price: Optional[float]
+    pickup_address: Optional[AddressPatchSchema]
+    dropoff_address: Optional[AddressPatchSchema]
+
+
+class OrderFilterSchema(FilterSchema):
+    price_min: Optional[float] = Field(None, filter=("price", "gte"))
+    price_max: Optional[float] = Field(None, filter=("price", "lte"))
+    created_after: Optional[datetime] = Field(None, filter=("created_at", "gte"))
+    created_before: Optional[datetime] = Field(None, filter=("created_at", "lt"))
+    updated_after: Optional[datetime] = Field(None, filter=("updated_at", "gte"))
+    updated_before: Optional[datetime] = Field(None, filter=("updated_at", "lt"))
+    name_prefix: Optional[str] = Field(None, filter=("name", "prefix"))
+    pickup_city: Optional[str] = Field(None, filter=("pickup_city", "eq"))
+    pickup_postal_code: Optional[str] = Field(None, filter=("pickup_postal_code", "eq"))
+    dropoff_city: Optional[str] = Field(None, filter=("dropoff_city", "eq"))
+    dropoff_postal_code: Optional[str] = Field(None, filter=("dropoff_postal_code", "eq"))
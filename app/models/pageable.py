@@ -1,33 +1,116 @@
+import base64
 import math
-from typing import List, Optional, Literal, Any
+import operator
+from typing import List, Optional, Literal, Any, Tuple
 
-from pydantic import BaseModel
+from pydantic import BaseModel, validator, parse_obj_as
 from sqlalchemy.orm import InstrumentedAttribute
 
 
+class PageCursor(BaseModel):
+    """
+    Opaque keyset position: the sort key of a row plus its id as a tiebreaker.
+    `backwards` marks a cursor that seeks the rows before the position (prev page).
+    """
+
+    sort: str
+    direction: Literal['ASC', 'DESC']
+    value: Any
+    id: int
+    backwards: bool = False
+
+    def encode(self) -> str:
+        return base64.urlsafe_b64encode(self.json().encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str) -> "PageCursor":
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            return cls.parse_raw(base64.urlsafe_b64decode(padded.encode()))
+        except ValueError:
+            raise ValueError("cursor is not valid")
+
+    def sql_value(self, sort: InstrumentedAttribute):
+        return parse_obj_as(sort.type.python_type, self.value) if self.value is not None else None
+
+
 class PageRequestSchema(BaseModel):
     page: Optional[int] = 1
     size: Optional[int] = 25
     sort: Optional[str] = 'created_at'
     direction: Optional[Literal['ASC', 'DESC']] = 'DESC'
+    paging: Optional[Literal['offset', 'keyset']] = 'offset'
+    cursor: Optional[str] = None
+    count: Optional[Literal['exact', 'estimated', 'cached', 'none']] = 'exact'
+
+    @validator("cursor")
+    def valid_cursor(cls, cursor: Optional[str], values: dict) -> Optional[str]:
+        if cursor is not None:
+            decoded = PageCursor.decode(cursor)
+            if decoded.sort != values.get("sort") or decoded.direction != values.get("direction"):
+                raise ValueError("cursor does not match sort and direction")
+        return cursor
 
     @property
     def offset(self):
         return (self.page - 1) * self.size
 
+    @property
+    def is_keyset(self) -> bool:
+        return self.paging == 'keyset' or self.cursor is not None
+
+    @property
+    def page_cursor(self) -> Optional[PageCursor]:
+        return PageCursor.decode(self.cursor) if self.cursor else None
+
     def sql_sort(self, sort: InstrumentedAttribute):
         return sort.asc() if self.direction == "ASC" else sort.desc()
 
+    def build_cursor(self, row, backwards: bool = False) -> str:
+        return PageCursor(
+            sort=self.sort,
+            direction=self.direction,
+            value=getattr(row, self.sort),
+            id=row.id,
+            backwards=backwards,
+        ).encode()
+
+
+FILTER_OPERATORS = {
+    "eq": operator.eq,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "prefix": lambda column, value: column.startswith(value, autoescape=True),
+}
+
+
+class FilterSchema(BaseModel):
+    """
+    Query filters, each field declares the filterable key and operator it compiles to:
+    `price_min: Optional[float] = Field(None, filter=("price", "gte"))`. Unset fields are not applied.
+    """
+
+    def filters(self) -> List[Tuple[str, str, Any]]:
+        return [
+            (*field.field_info.extra["filter"], getattr(self, name))
+            for name, field in self.__fields__.items()
+            if getattr(self, name) is not None
+        ]
+
 
 class PageResponseSchema(BaseModel):
     data: List[Any]
     total_pages: Optional[int]
-    total_count: int
+    total_count: Optional[int]
+    count_strategy: Optional[str] = 'exact'
     page_size: int
+    has_next: Optional[bool] = None
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
     def __init__(self, **data):
         super().__init__(**data)
 
-        self.total_pages = math.ceil(self.total_count / self.page_size)
-
-
+        if self.total_count is not None:
+            self.total_pages = math.ceil(self.total_count / self.page_size)
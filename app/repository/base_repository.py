@@ -1,13 +1,32 @@
-from sqlalchemy import select, delete, func
+import json
+from typing import Sequence, Optional, Set, Dict, Any, AsyncIterator, List, Tuple
+
+from sqlalchemy import select, delete, update, func, tuple_, text, any_, bindparam, and_, or_
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.exc import NoResultFound
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
+from app.config.settings import get_settings
 from app.models.base import BaseOrm
-from app.models.pageable import PageRequestSchema
-from app.utils.db_session import sessionmaker, get_db_session
+from app.models.pageable import PageRequestSchema, PageResponseSchema, FilterSchema, FILTER_OPERATORS
+from app.utils.count_cache import get_count_cache
+from app.utils import server_timing
+from app.utils.batch_loader import BatchLoader, get_loader
+from app.utils.db_session import sessionmaker, get_db_session, get_read_session, can_share_reads, outside_unit_of_work, \
+    run_after_commit
 
 
 class BaseRepository:
+    """
+    `__sortable__` whitelists the columns pages can be sorted by, None allows any column.
+    `__filterable__` maps filter keys to a column, or to a `(foreign key, column)` pair for
+    filtering on a related table through an `IN (SELECT id ...)` subquery.
+    """
+
     __abstract__ = True
+    __sortable__: Optional[Set[str]] = None
+    __filterable__: Dict[str, Any] = {}
 
     def __init__(self, model: BaseOrm):
         self.__model__ = model
@@ -22,39 +41,288 @@ class BaseRepository:
             await session.delete(data)
 
     async def get_by_id(self, id, *args):
-        async with get_db_session() as session:
+        """
+        Lookups that may share their results with other requests are batched with concurrent ones into
+        one `get_by_ids` query, see `BatchLoader`.
+        """
+        if get_settings().batch_load_enabled and can_share_reads():
             try:
-                execute = await session.execute(select(self.__model__).filter_by(id=id))
-                return execute.one()[0]
+                return await self._id_loader().load(id)
             except NoResultFound as e:
                 if args:
                     return args[0]
                 raise e
 
-    async def delete_by_id(self, entity_id: int):
-        async with get_db_session() as session:
-            await session.execute(delete(self.__model__).filter_by(id=entity_id))
-
-    async def get_by_ids(self, ids, *args):
-        async with get_db_session() as session:
+        async with get_read_session() as session:
             try:
-                return await session.execute(select(self.__model__).filter(self.__model__.id.in_(ids))).fetchall()
+                execute = await session.execute(self._by_id_query(id))
+                with server_timing.timed("orm"):
+                    return execute.one()[0]
             except NoResultFound as e:
                 if args:
                     return args[0]
                 raise e
 
-    async def get_paged_items(self, pageable: PageRequestSchema, params: dict):
+    async def update_by_id(self, entity_id: int, values: dict, clauses: Sequence = ()):
+        """
+        Sets `values` on the row with a single `UPDATE ... RETURNING` and returns it as an entity,
+        raises `NoResultFound` when there is no such row or it does not match `clauses`.
+        """
         async with get_db_session() as session:
-            data = []
-            execute = await session.execute(select(func.count()).select_from(self.__model__).filter_by(**params))
-            total_count = execute.scalar()
-            if total_count > 0:
-                # query = db.query(self.__model__).filter_by(**params)
-                sort = getattr(self.__model__, pageable.sort)
+            return await self._update_returning(session, entity_id, values, clauses)
+
+    async def _update_returning(self, session: AsyncSession, entity_id: int, values: dict, clauses: Sequence = ()):
+        # the updated row comes back from a CTE, selecting the entity from it adds the joined relationships
+        updated = (
+            update(self.__model__).where(self.__model__.id == entity_id, *clauses).values(**values)
+            .returning(*self.__model__.__table__.columns).cte("updated")
+        )
+        execute = await session.execute(
+            select(aliased(self.__model__, updated)), execution_options={"populate_existing": True}
+        )
+        with server_timing.timed("orm"):
+            return execute.one()[0]
+
+    async def delete_by_id(self, entity_id: int, clauses: Sequence = ()) -> bool:
+        async with get_db_session() as session:
+            execute = await session.execute(delete(self.__model__).filter_by(id=entity_id).filter(*clauses))
+            return execute.rowcount > 0
+
+    async def get_updated_at(self, entity_id: int):
+        """
+        Just the row's version, without loading or joining anything else
+        """
+        async with get_read_session() as session:
+            execute = await session.execute(select(self.__model__.updated_at).filter_by(id=entity_id))
+            return execute.scalar_one()
+
+    async def get_by_ids(self, ids: Sequence[int]) -> list:
+        """
+        Rows for the ids that exist, in no particular order.
+        """
+        async with get_read_session() as session:
+            execute = await session.execute(self._by_ids_query(ids))
+            with server_timing.timed("orm"):
+                return execute.unique().scalars().all()
+
+    def _id_loader(self) -> BatchLoader:
+        def factory():
+            settings = get_settings()
+            return BatchLoader(self._load_by_ids, self._missing_id, settings.batch_load_window_ms / 1000,
+                               settings.batch_load_max_size)
+
+        return get_loader(self.__model__.__tablename__, factory)
+
+    async def _load_by_ids(self, ids: List[int]) -> dict:
+        rows = await outside_unit_of_work(lambda: self.get_by_ids(ids))
+        return {row.id: row for row in rows}
+
+    @staticmethod
+    def _missing_id(id) -> NoResultFound:
+        return NoResultFound("No row was found when one was required")  # what `.one()` raises for a single id
+
+    async def get_paged_items(self, pageable: PageRequestSchema, params: dict, clauses: Sequence = (),
+                              filters: Optional[FilterSchema] = None) -> PageResponseSchema:
+        sort = self._sort_column(pageable.sort)
+        clauses = [*clauses, *self._compile_filters(filters)]
+        async with get_read_session() as session:
+            total_count = await self._count_items(session, pageable, params, clauses)
+            page = PageResponseSchema(
+                data=[], total_count=total_count, count_strategy=pageable.count, page_size=pageable.size
+            )
+            # estimates can be stale, so only an exact zero skips the page query
+            if total_count != 0 or pageable.count == "estimated":
+                if pageable.is_keyset:
+                    await self._fill_keyset_page(session, pageable, params, clauses, page)
+                else:
+                    # query = db.query(self.__model__).filter_by(**params)
+                    execute = await session.execute(self._page_query(pageable, sort, params, clauses))
+                    with server_timing.timed("orm"):
+                        data = execute.scalars().all()
+                    page.has_next = len(data) > pageable.size
+                    page.data = data[:pageable.size]
+            return page
+
+    def warm_up_statements(self) -> list:
+        """
+        The statements behind the hot read paths with default paging. Running them once per pooled connection
+        at startup fills SQLAlchemy's compiled cache and each connection's prepared statement cache.
+        """
+        pageable = PageRequestSchema()
+        sort = self._sort_column(pageable.sort)
+        return [
+            self._by_id_query(0),
+            self._by_ids_query([0]),
+            self._count_query({}, ()),
+            self._page_query(pageable, sort, {}, ()),
+        ]
+
+    def _by_id_query(self, id):
+        return select(self.__model__).filter_by(id=id)
+
+    def _by_ids_query(self, ids: Sequence[int]):
+        # one array parameter keeps a single prepared statement for any number of ids, unlike IN (...)
+        return select(self.__model__).filter(
+            self.__model__.id == any_(bindparam("ids", list(ids), type_=ARRAY(self.__model__.id.type)))
+        )
+
+    def _count_query(self, params: dict, clauses: Sequence):
+        return select(func.count()).select_from(self.__model__).filter_by(**params).filter(*clauses)
+
+    def _filtered_ids_query(self, params: dict, clauses: Sequence):
+        return select(self.__model__.id).filter_by(**params).filter(*clauses)
+
+    def _page_query(self, pageable: PageRequestSchema, sort, params: dict, clauses: Sequence):
+        # id breaks ties so pages are stable and the (sort, id) index serves the ORDER BY
+        return (
+            select(self.__model__).filter_by(**params).filter(*clauses)
+            .order_by(pageable.sql_sort(sort), pageable.sql_sort(self.__model__.id))
+            .limit(pageable.size + 1).offset(pageable.offset)
+        )
+
+    async def stream_items(self, params: dict, clauses: Sequence = (), filters: Optional[FilterSchema] = None,
+                           fetch_size: int = 1000) -> AsyncIterator[List[BaseOrm]]:
+        """
+        Yields every matching row in id order, `fetch_size` rows at a time, from a server-side cursor.
+        The next batch is only fetched once the previous one is consumed, so memory stays flat and a slow
+        consumer holds the cursor open instead of buffering rows.
+        """
+        clauses = [*clauses, *self._compile_filters(filters)]
+        async with get_read_session() as session:
+            result = await session.stream(
+                select(self.__model__).filter_by(**params).filter(*clauses).order_by(self.__model__.id)
+                .execution_options(yield_per=fetch_size)
+            )
+            async for partition in result.unique().scalars().partitions():
+                yield partition
+
+    def _sort_column(self, sort: str):
+        column = getattr(self.__model__, sort)
+        if self.__sortable__ is not None and sort not in self.__sortable__:
+            raise AttributeError(
+                f"{self.__model__.__name__} can not be sorted by '{sort}', use one of {sorted(self.__sortable__)}"
+            )
+        return column
+
+    def _compile_filters(self, filters: Optional[FilterSchema]) -> list:
+        clauses = []
+        for key, op, value in filters.filters() if filters is not None else ():
+            if key not in self.__filterable__:
+                raise AttributeError(f"{self.__model__.__name__} can not be filtered by '{key}'")
+            target = self.__filterable__[key]
+            if isinstance(target, tuple):
+                foreign_key, column = target
+                related = select(column.class_.id).filter(FILTER_OPERATORS[op](column, value))
+                clauses.append(foreign_key.in_(related))
+            else:
+                clauses.append(FILTER_OPERATORS[op](target, value))
+        return clauses
+
+    async def invalidate_counts(self):
+        table = self.__model__.__tablename__
+        get_count_cache().invalidate(table)
+
+        async def invalidate_after_commit():
+            # a count racing the write may have cached the old total in between
+            get_count_cache().invalidate(table)
+
+        await run_after_commit(invalidate_after_commit)
+
+    async def _count_items(self, session, pageable: PageRequestSchema, params: dict, clauses: Sequence):
+        """
+        exact: count(*) over the filtered table
+        estimated: planner statistics, pg_class.reltuples when unfiltered or the EXPLAIN row estimate otherwise
+        cached: exact count memoized per filter until the TTL expires or the table is written to
+        none: no count, the page reports has_next instead
+        """
+        count_query = self._count_query(params, clauses)
+        if pageable.count == "none":
+            return None
+
+        if pageable.count == "estimated":
+            if not params and not clauses:
                 execute = await session.execute(
-                    select(self.__model__).filter_by(**params).order_by(pageable.sql_sort(sort))
-                    .limit(pageable.size).offset(pageable.offset)
+                    text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+                    {"table": self.__model__.__tablename__},
                 )
-                data = execute.scalars().all()
-            return data, total_count
+                estimate = execute.scalar()
+            else:
+                # the filtered select's top node estimates the matching rows, under a count(*) the planner
+                # may aggregate in parallel and the node below reports one row per worker instead
+                sql, parameters = self._compiled_sql(session, self._filtered_ids_query(params, clauses))
+                connection = await session.connection()
+                plan = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}", parameters)
+                plan = plan.scalar()
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                estimate = int(plan[0]["Plan"]["Plan Rows"])
+            if estimate is not None and estimate >= 0:  # reltuples is -1 until the table is analyzed
+                return estimate
+
+        if pageable.count == "cached":
+            table = self.__model__.__tablename__
+            sql, parameters = self._compiled_sql(session, count_query)
+            key = (sql, parameters)
+            total_count = get_count_cache().get(table, key)
+            if total_count is None:
+                execute = await session.execute(count_query)
+                total_count = execute.scalar()
+                get_count_cache().set(table, key, total_count)
+            return total_count
+
+        execute = await session.execute(count_query)
+        return execute.scalar()
+
+    @staticmethod
+    def _compiled_sql(session, query) -> Tuple[str, tuple]:
+        """
+        SQL of `query` for the session's dialect and its positional parameters, request values stay bound.
+        """
+        compiled = query.compile(dialect=session.bind.dialect)
+        parameters = compiled.construct_params()
+        return str(compiled), tuple(parameters[name] for name in compiled.positiontup)
+
+    def _seek_clause(self, sort, value, id, descending: bool):
+        # a row comparison with a NULL on either side is NULL, so rows with a NULL sort value get their own branch
+        id_column = self.__model__.id
+        if value is None:
+            after_in_nulls = and_(sort.is_(None), id_column < id if descending else id_column > id)
+            return or_(after_in_nulls, sort.is_not(None)) if descending else after_in_nulls
+        key = tuple_(sort, id_column)
+        position = tuple_(value, id)
+        return key < position if descending else or_(key > position, sort.is_(None))
+
+    async def _fill_keyset_page(self, session, pageable: PageRequestSchema, params: dict, clauses: Sequence,
+                                page: PageResponseSchema):
+        """
+        Seeks past the cursor with `WHERE (sort, id) < (value, id)` instead of skipping rows with OFFSET,
+        so every page costs the same no matter how deep it is. One extra row is fetched to detect more pages.
+        NULL sort values come last ascending and first descending, like postgres and offset paging order them.
+        """
+        sort = self._sort_column(pageable.sort)
+        cursor = pageable.page_cursor
+        backwards = cursor.backwards if cursor else False
+        descending = (pageable.direction == "DESC") != backwards
+
+        query = select(self.__model__).filter_by(**params).filter(*clauses)
+        if cursor:
+            query = query.where(self._seek_clause(sort, cursor.sql_value(sort), cursor.id, descending))
+        if descending:
+            order_by = (sort.desc().nulls_first(), self.__model__.id.desc())
+        else:
+            order_by = (sort.asc().nulls_last(), self.__model__.id.asc())
+
+        execute = await session.execute(query.order_by(*order_by).limit(pageable.size + 1))
+        with server_timing.timed("orm"):
+            data = execute.scalars().all()
+        has_more = len(data) > pageable.size
+        data = data[:pageable.size]
+        if backwards:
+            data.reverse()
+
+        page.has_next = has_more or (backwards and bool(data))
+        if data:
+            if has_more or backwards:
+                page.next_cursor = pageable.build_cursor(data[-1])
+            if cursor and (has_more or not backwards):
+                page.prev_cursor = pageable.build_cursor(data[0], backwards=True)
+        page.data = data
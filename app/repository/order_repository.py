@@ -1,25 +1,207 @@
 import logging
+from typing import List, AsyncIterator, Dict, Sequence, Optional
 
-from sqlalchemy import or_, select
+from pydantic import ValidationError
+from sqlalchemy import select, insert, update, union, text, literal
 from sqlalchemy.exc import NoResultFound
 
-from app.models.order import OrderOrm
+from app.models.address import AddressOrm, AddressSchema
+from app.models.base import BaseSchema
+from app.models.order import OrderOrm, OrderSchema, generate_order_number
+from app.models.pageable import PageRequestSchema, PageResponseSchema
 from app.repository.base_repository import BaseRepository
-from app.utils.db_session import get_db_session
+from app.utils import server_timing
+from app.utils.db_session import get_db_session, get_read_session
 
 logger = logging.getLogger(__name__)
 
 
 class OrderRepository(BaseRepository):
+    __address_keys__ = {"pickup_address": OrderOrm.pickup_id, "dropoff_address": OrderOrm.dropoff_id}
+    __sortable__ = {"id", "created_at", "updated_at", "price", "name"}
+    __filterable__ = {
+        "price": OrderOrm.price,
+        "created_at": OrderOrm.created_at,
+        "updated_at": OrderOrm.updated_at,
+        "name": OrderOrm.name,
+        "pickup_city": (OrderOrm.pickup_id, AddressOrm.city),
+        "pickup_postal_code": (OrderOrm.pickup_id, AddressOrm.postal_code),
+        "dropoff_city": (OrderOrm.dropoff_id, AddressOrm.city),
+        "dropoff_postal_code": (OrderOrm.dropoff_id, AddressOrm.postal_code),
+    }
+
     def __init__(self):
         super().__init__(OrderOrm)
 
     async def get_by_address_id(self, address_id):
-        async with get_db_session() as session:
+        """
+        Most recent order using the address as pickup or dropoff
+        """
+        async with get_read_session() as session:
             try:
-                clause = or_(OrderOrm.pickup_id == address_id, OrderOrm.dropoff_id == address_id)
-                result = await session.execute(select(self.__model__).filter(clause))
-                return result.one()[0]
+                result = await session.execute(
+                    select(self.__model__).filter(self._address_clause(address_id))
+                    .order_by(self.__model__.id.desc()).limit(1)
+                )
+                with server_timing.timed("orm"):
+                    return result.one()[0]
             except NoResultFound as e:
-                logger.exception(f'{self.__model__.__name__} not found with address id: {id}')
+                logger.exception(f'{self.__model__.__name__} not found with address id: {address_id}')
                 raise e
+
+    async def get_paged_by_address_id(self, address_id, pageable: PageRequestSchema) -> PageResponseSchema:
+        return await self.get_paged_items(pageable, {}, [self._address_clause(address_id)])
+
+    async def update_with_addresses(self, order_id: int, values: dict, addresses: Dict[str, dict],
+                                    clauses: Sequence = ()) -> OrderOrm:
+        """
+        Updates the order's pickup and/or dropoff address in place (`addresses` is keyed by relationship name),
+        then the order itself with `UPDATE ... RETURNING`, all in one transaction and one round trip each.
+        An address the order doesn't have yet is inserted instead, which takes one more round trip.
+        """
+        values = dict(values)
+        async with get_db_session() as session:
+            for key, address_values in addresses.items():
+                foreign_key = self.__address_keys__[key]
+                address_id = select(foreign_key).filter(OrderOrm.id == order_id, *clauses).scalar_subquery()
+                execute = await session.execute(
+                    update(AddressOrm).filter(AddressOrm.id == address_id).values(**address_values)
+                    .returning(AddressOrm.id)
+                )
+                if execute.first() is None:
+                    created_id = await self._insert_missing_address(session, order_id, foreign_key, address_values,
+                                                                    clauses)
+                    if created_id is not None:
+                        values[foreign_key.key] = created_id
+            return await self._update_returning(session, order_id, values, clauses)
+
+    @staticmethod
+    async def _insert_missing_address(session, order_id: int, foreign_key, address_values: dict,
+                                      clauses: Sequence) -> Optional[int]:
+        """
+        Inserts the address of an order whose `foreign_key` is NULL, the patch must then be a complete address.
+        None when no such order matches, the order update reports it as not found.
+        """
+        missing = select(OrderOrm.id).filter(OrderOrm.id == order_id, foreign_key.is_(None), *clauses).exists()
+        try:
+            address = AddressSchema(**address_values)
+        except ValidationError:
+            if await session.scalar(select(missing)):
+                raise
+            return None
+        row = address.dict(exclude=set(BaseSchema.__transient_fields__))
+        columns = AddressOrm.__table__.columns
+        execute = await session.execute(
+            insert(AddressOrm)
+            .from_select(list(row), select(*[literal(value, columns[name].type) for name, value in row.items()])
+                         .where(missing))
+            .returning(AddressOrm.id)
+        )
+        return execute.scalar()
+
+    @staticmethod
+    def _address_clause(address_id):
+        # a UNION of two single-column lookups lets each side use its own index,
+        # where OR(pickup_id = x, dropoff_id = x) tends to fall back to a sequential scan
+        order_ids = union(
+            select(OrderOrm.id).filter(OrderOrm.pickup_id == address_id),
+            select(OrderOrm.id).filter(OrderOrm.dropoff_id == address_id),
+        )
+        return OrderOrm.id.in_(order_ids)
+
+    async def save_all(self, orders: List[OrderSchema]) -> List[int]:
+        """
+        Inserts all addresses in one multi-row `INSERT ... RETURNING id`, wires the returned ids into the
+        orders as foreign keys and inserts the orders the same way. Ids come back in input order.
+        """
+        transient_fields = set(BaseSchema.__transient_fields__)
+        address_rows = []
+        order_rows = []
+        for order in orders:
+            order_row = order.dict(exclude=transient_fields | {"pickup_address", "dropoff_address"})
+            order_row["order_number"] = order_row["order_number"] or generate_order_number()
+            for key in ("pickup_address", "dropoff_address"):
+                address = getattr(order, key)
+                if address is not None:
+                    address_rows.append(address.dict(exclude=transient_fields))
+            order_rows.append(order_row)
+
+        async with get_db_session() as session:
+            address_ids = []
+            if address_rows:
+                execute = await session.execute(
+                    insert(AddressOrm).returning(AddressOrm.id, sort_by_parameter_order=True), address_rows
+                )
+                address_ids = execute.scalars().all()
+
+            address_ids = iter(address_ids)
+            for order, order_row in zip(orders, order_rows):
+                order_row["pickup_id"] = next(address_ids) if order.pickup_address is not None else None
+                order_row["dropoff_id"] = next(address_ids) if order.dropoff_address is not None else None
+
+            execute = await session.execute(
+                insert(OrderOrm).returning(OrderOrm.id, sort_by_parameter_order=True), order_rows
+            )
+            return execute.scalars().all()
+
+    async def copy_all(self, chunks: AsyncIterator[List[OrderSchema]]) -> int:
+        """
+        Loads orders with COPY into temporary staging tables and moves each chunk into `addresses` and `orders`
+        with set-based INSERT ... SELECT. The staging tables copy the real tables' defaults, so ids are drawn
+        from the real sequences during COPY and orders find their addresses by joining on the staged row number.
+        """
+        address_columns = [column.name for column in AddressOrm.__table__.columns
+                           if column.name not in BaseSchema.__transient_fields__]
+        order_columns = ["order_number", "name", "price"]
+        count = 0
+        async with get_db_session() as session:
+            # creating the staging tables through the session also opens its transaction, the tables go with it
+            for statement in self._staging_sql():
+                await session.execute(text(statement))
+            # statements reading staging tables go through the driver's simple query protocol,
+            # prepared statements cached against a temporary table would outlive the table
+            connection = await session.connection()
+            driver = (await connection.get_raw_connection()).driver_connection
+            async for orders in chunks:
+                order_records = []
+                address_records = []
+                for row_number, order in enumerate(orders, start=count):
+                    order_records.append((row_number, order.order_number or generate_order_number(),
+                                          order.name, order.price))
+                    for role, address in (("pickup", order.pickup_address), ("dropoff", order.dropoff_address)):
+                        if address is not None:
+                            address_records.append((row_number, role,
+                                                    *(getattr(address, column) for column in address_columns)))
+
+                await driver.copy_records_to_table("import_orders", records=order_records,
+                                                   columns=["row_number", *order_columns])
+                if address_records:
+                    await driver.copy_records_to_table("import_addresses", records=address_records,
+                                                       columns=["row_number", "role", *address_columns])
+                await driver.execute(self._move_staged_sql(address_columns, order_columns))
+                count += len(orders)
+        return count
+
+    @staticmethod
+    def _staging_sql() -> List[str]:
+        return [
+            f"CREATE TEMP TABLE import_orders (LIKE {OrderOrm.__tablename__} INCLUDING DEFAULTS, "
+            f"row_number bigint) ON COMMIT DROP",
+            f"CREATE TEMP TABLE import_addresses (LIKE {AddressOrm.__tablename__} INCLUDING DEFAULTS, "
+            f"row_number bigint, role text) ON COMMIT DROP",
+        ]
+
+    @staticmethod
+    def _move_staged_sql(address_columns: List[str], order_columns: List[str]) -> str:
+        addresses = ", ".join(["id", "created_at", "updated_at", *address_columns])
+        orders = ", ".join(["id", "created_at", "updated_at", *order_columns])
+        staged_orders = ", ".join(f"o.{column}" for column in ["id", "created_at", "updated_at", *order_columns])
+        return f"""
+            INSERT INTO {AddressOrm.__tablename__} ({addresses}) SELECT {addresses} FROM import_addresses;
+            INSERT INTO {OrderOrm.__tablename__} ({orders}, pickup_id, dropoff_id)
+            SELECT {staged_orders}, pickup.id, dropoff.id
+            FROM import_orders o
+            LEFT JOIN import_addresses pickup ON pickup.row_number = o.row_number AND pickup.role = 'pickup'
+            LEFT JOIN import_addresses dropoff ON dropoff.row_number = o.row_number AND dropoff.role = 'dropoff';
+            TRUNCATE import_orders, import_addresses;
+        """
@@ -0,0 +1,69 @@
+import os
+
+from gunicorn.app.base import BaseApplication
+from uvicorn.workers import UvicornWorker
+
+from app.config.settings import get_settings, get_database_settings
+
+settings = get_settings()
+
+
+class AppUvicornWorker(UvicornWorker):
+    CONFIG_KWARGS = {
+        "loop": settings.loop,
+        "http": settings.http,
+        "limit_concurrency": settings.limit_concurrency,
+    }
+
+
+class Server(BaseApplication):
+    """
+    Gunicorn master forking `worker_count` uvicorn workers. The application is created in each worker
+    after the fork (no preloading), so database pools and trace exporters are never shared across processes.
+    """
+
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app.main import create_application
+
+        return create_application()
+
+
+def size_worker_pools(workers: int) -> None:
+    """
+    Caps each worker's pool so all workers together stay within postgres max_connections.
+    Workers inherit the environment, so the limits are handed down as the pool settings.
+    """
+    pool_size, max_overflow = get_database_settings().worker_pool_limits(workers)
+    os.environ["POSTGRES_DB_POOL_SIZE"] = str(pool_size)
+    os.environ["POSTGRES_DB_MAX_OVERFLOW"] = str(max_overflow)
+    get_database_settings.cache_clear()
+
+
+def run() -> None:
+    workers = settings.worker_count
+    size_worker_pools(workers)
+    Server({
+        "bind": f"{settings.host}:{settings.port}",
+        "workers": workers,
+        "worker_class": "app.server.AppUvicornWorker",
+        "backlog": settings.backlog,
+        "keepalive": settings.keep_alive_seconds,
+        "max_requests": settings.max_requests,
+        "max_requests_jitter": settings.max_requests_jitter,
+        "graceful_timeout": settings.graceful_timeout_seconds,
+        "loglevel": settings.log_level,
+        "accesslog": "-",
+        "preload_app": False,
+    }).run()
+
+
+if __name__ == "__main__":
+    run()
@@ -1,31 +1,298 @@
-from typing import List, Tuple
+import csv
+import io
+from functools import lru_cache
+from typing import List, Optional, AsyncIterator, Literal, BinaryIO, Iterator, Tuple, Hashable, Callable, Awaitable, TypeVar
 
-from app.models.order import OrderOrm
-from app.models.pageable import PageRequestSchema
+import orjson
+from pydantic import ValidationError
+from sqlalchemy import false
+from sqlalchemy.exc import NoResultFound
+from starlette.concurrency import run_in_threadpool
+
+from app.config.settings import get_settings
+from app.models.batch import ImportResponseSchema, ImportRowErrorSchema
+from app.models.order import OrderOrm, OrderSchema, OrderFilterSchema, OrderPatchSchema
+from app.models.pageable import PageRequestSchema, PageResponseSchema
 from app.repository.order_repository import OrderRepository
+from app.utils import db_session, server_timing
+from app.utils.cache import CacheBackend, build_cache
+from app.utils.etag import entity_etag, parse_entity_etags, PreconditionFailedError
+from app.utils.single_flight import SingleFlight
+
+T = TypeVar("T")
+
+order_reads = SingleFlight("order")
+
+
+@lru_cache(maxsize=1)
+def get_order_cache() -> Optional[CacheBackend]:
+    settings = get_settings()
+    return build_cache(settings.order_cache_backend, "order", settings.order_cache_ttl_seconds,
+                       settings.order_cache_max_bytes, settings.redis_url)
 
 
 class OrderService:
     def __init__(self):
         self.order_repo: OrderRepository = OrderRepository()
+        self.order_cache: Optional[CacheBackend] = get_order_cache()
 
     async def create_order(self, order: OrderOrm) -> OrderOrm:
-        return await self.order_repo.save(order)
+        order = await self.order_repo.save(order)
+        await self.order_repo.invalidate_counts()
+        await self._evict_order(order.id)
+        return order
+
+    async def create_orders(self, orders: List[OrderSchema]) -> List[int]:
+        ids = await self.order_repo.save_all(orders)
+        await self.order_repo.invalidate_counts()
+        return ids
+
+    async def get_order(self, order_id: int) -> OrderSchema:
+        if self.order_cache is None:
+            order_orm = await self._shared_read(("id", order_id), lambda: self.order_repo.get_by_id(order_id))
+            with server_timing.timed("serialize"):
+                return OrderSchema.from_orm_fast(order_orm)
+        return OrderSchema.parse_raw((await self.get_order_json(order_id))[1])
 
-    async def get_order(self, order_id: int) -> OrderOrm:
-        return await self.order_repo.get_by_id(order_id)
+    async def get_order_json(self, order_id: int) -> Tuple[str, bytes]:
+        """
+        The order's ETag and JSON body. Cache entries hold both, the ETag on the first line.
+        """
+        if self.order_cache is not None:
+            cached = await self.order_cache.get(str(order_id))
+            if cached is not None:
+                etag, _, order = cached.partition(b"\n")
+                return etag.decode(), order
+        return await self._shared_read(("json", order_id), lambda: self._load_order_json(order_id))
+
+    async def _load_order_json(self, order_id: int) -> Tuple[str, bytes]:
+        order_orm = await self.order_repo.get_by_id(order_id)
+        etag = entity_etag(order_orm.id, order_orm.updated_at)
+        with server_timing.timed("serialize"):
+            data = OrderSchema.dump_orm(order_orm)
+        with server_timing.timed("encode"):
+            order = orjson.dumps(data)
+        if self.order_cache is not None:
+            await self.order_cache.set(str(order_id), etag.encode() + b"\n" + order)
+        return etag, order
+
+    async def get_order_etag(self, order_id: int) -> str:
+        """
+        The current ETag from the cache or from a probe of `updated_at`, cheaper than loading the order.
+        """
+        if self.order_cache is not None:
+            cached = await self.order_cache.get(str(order_id))
+            if cached is not None:
+                return cached.partition(b"\n")[0].decode()
+        return entity_etag(order_id, await self.order_repo.get_updated_at(order_id))
+
+    async def get_orders_by_ids(self, order_ids: List[int]) -> Tuple[List[OrderOrm], List[int]]:
+        """
+        The orders found for `order_ids` in request order, and the ids that were not found.
+        """
+        orders = {order.id: order for order in await self.order_repo.get_by_ids(order_ids)}
+        order_ids = list(dict.fromkeys(order_ids))
+        return [orders[order_id] for order_id in order_ids if order_id in orders], \
+            [order_id for order_id in order_ids if order_id not in orders]
 
     async def get_order_by_address_id(self, address_id: int) -> OrderOrm:
-        return await self.order_repo.get_by_address_id(address_id)
+        return await self._shared_read(("address", address_id),
+                                       lambda: self.order_repo.get_by_address_id(address_id))
+
+    async def get_paged_orders_by_address_id(self, address_id: int,
+                                             pageable: PageRequestSchema) -> PageResponseSchema:
+        page = await self._shared_read(("address_page", address_id, pageable.json()),
+                                       lambda: self.order_repo.get_paged_by_address_id(address_id, pageable))
+        return page.copy()  # callers replace `data` with their serialized rows
+
+    async def update_order(self, order_id: int, updated_order: OrderSchema, if_match: Optional[str] = None) -> OrderOrm:
+        values = {"name": updated_order.name, "price": updated_order.price}
+        try:
+            order = await self.order_repo.update_by_id(order_id, values, self._if_match_clauses(order_id, if_match))
+        except NoResultFound:
+            self._raise_if_precondition(if_match)
+            raise
+        await self.order_repo.invalidate_counts()
+        await self._evict_order(order_id)
+        return order
+
+    async def patch_order(self, order_id: int, patch: OrderPatchSchema, if_match: Optional[str] = None) -> OrderOrm:
+        values = patch.changes()
+        addresses = {key: values.pop(key) for key in OrderRepository.__address_keys__ if key in values}
+        try:
+            order = await self.order_repo.update_with_addresses(order_id, values, addresses,
+                                                                self._if_match_clauses(order_id, if_match))
+        except NoResultFound:
+            self._raise_if_precondition(if_match)
+            raise
+        await self.order_repo.invalidate_counts()
+        await self._evict_order(order_id)
+        return order
+
+    async def delete_order(self, order_id: int, if_match: Optional[str] = None):
+        deleted = await self.order_repo.delete_by_id(order_id, self._if_match_clauses(order_id, if_match))
+        if not deleted:
+            self._raise_if_precondition(if_match)
+        await self.order_repo.invalidate_counts()
+        await self._evict_order(order_id)
+
+    @staticmethod
+    def _if_match_clauses(order_id: int, if_match: Optional[str]) -> list:
+        """
+        `If-Match` as a condition of the write itself, so no other write can land between a check and the write.
+        """
+        if if_match is None or if_match.strip() == "*":
+            return []
+        versions = [updated_at for entity_id, updated_at in parse_entity_etags(if_match) if entity_id == order_id]
+        return [OrderOrm.updated_at.in_(versions)] if versions else [false()]
+
+    @staticmethod
+    def _raise_if_precondition(if_match: Optional[str]) -> None:
+        # when If-Match is given, a write that matched no row failed its precondition (RFC 9110, 13.1.1)
+        if if_match is not None:
+            raise PreconditionFailedError("order was modified or deleted since the If-Match ETag was read")
+
+    async def get_paged_orders(self, pageable: PageRequestSchema,
+                               filters: Optional[OrderFilterSchema] = None) -> PageResponseSchema:
+        key = ("page", pageable.json(), filters.json() if filters is not None else None)
+        page = await self._shared_read(key, lambda: self.order_repo.get_paged_items(pageable, {}, filters=filters))
+        return page.copy()  # callers replace `data` with their serialized rows
+
+    async def export_orders(self, export_format: Literal["ndjson", "csv"],
+                            filters: Optional[OrderFilterSchema] = None) -> AsyncIterator[bytes]:
+        """
+        Streams the orders as NDJSON lines or CSV rows with flattened addresses, one chunk per fetched batch.
+        It runs after the response has started, when the request's unit of work is already completed,
+        so the repository reads through a session of its own.
+        """
+        columns = OrderSchema.flat_columns()
+        if export_format == "csv":
+            yield self._csv_chunk([columns])
+
+        batches = self.order_repo.stream_items({}, filters=filters, fetch_size=get_settings().export_fetch_size)
+        async for orders in batches:
+            rows = [OrderSchema.dump_orm(order) for order in orders]
+            if export_format == "csv":
+                yield self._csv_chunk([list(OrderSchema.flatten(row).values()) for row in rows])
+            else:
+                yield b"".join(orjson.dumps(row) + b"\n" for row in rows)
+
+    async def import_orders(self, file: BinaryIO, import_format: Literal["ndjson", "csv"]) -> ImportResponseSchema:
+        """
+        Reads the upload a chunk of rows at a time, validating each chunk in a worker thread, and hands the
+        valid rows of each chunk to the repository's COPY loader, so only one chunk is ever held in memory.
+        Rows are accepted or rejected individually, rejected rows are reported by line and field.
+        Bytes that are not utf-8 are kept as surrogates while reading, so only the rows holding them are rejected.
+        """
+        settings = get_settings()
+        result = ImportResponseSchema()
+        text = io.TextIOWrapper(file, encoding="utf-8", errors="surrogateescape", newline="")
+        rows = self._csv_rows(text) if import_format == "csv" else self._ndjson_rows(text)
+
+        async def valid_chunks() -> AsyncIterator[List[OrderSchema]]:
+            while True:
+                orders, errors, rejected = await run_in_threadpool(self._validate_chunk, rows, import_format,
+                                                                   settings.import_chunk_size)
+                result.rejected_count += rejected
+                result.errors.extend(errors[:settings.import_max_reported_errors - len(result.errors)])
+                if orders:
+                    yield orders
+                if orders is None:
+                    return
+
+        try:
+            result.accepted_count = await self.order_repo.copy_all(valid_chunks())
+        finally:
+            text.detach()  # the upload owns the underlying file
+        await self.order_repo.invalidate_counts()
+        return result
+
+    @staticmethod
+    def _csv_rows(text: io.TextIOWrapper) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+        """
+        (line, row, None) for readable rows and (line, None, reason) for rows that can not be read
+        """
+        reader = csv.DictReader(text)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                yield reader.line_num, None, str(e)
+                continue
+            if None in row:  # values past the header's columns
+                columns = len(reader.fieldnames)
+                yield reader.line_num, None, f"row has {columns + len(row[None])} fields, the header has {columns}"
+            elif not all(_is_utf8(value) for value in row.values() if value):
+                yield reader.line_num, None, "line is not valid utf-8"
+            else:
+                yield reader.line_num, OrderSchema.unflatten(row), None
+
+    @staticmethod
+    def _ndjson_rows(text: io.TextIOWrapper) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+        for line_number, line in enumerate(text, start=1):
+            if line.strip():
+                if not _is_utf8(line):
+                    yield line_number, None, "line is not valid utf-8"
+                    continue
+                try:
+                    yield line_number, orjson.loads(line), None
+                except orjson.JSONDecodeError:
+                    yield line_number, None, "line is not valid json"
+
+    @staticmethod
+    def _validate_chunk(rows: Iterator[Tuple[int, Optional[dict], Optional[str]]], import_format: str, size: int):
+        """
+        Validates up to `size` rows. Returns the valid orders (None once the rows are exhausted),
+        the errors of the invalid rows and how many rows were invalid.
+        """
+        separator = "." if import_format == "csv" else "/"
+        orders: List[OrderSchema] = []
+        errors: List[ImportRowErrorSchema] = []
+        rejected = 0
+        for line, row, error in rows:
+            if error is not None:
+                rejected += 1
+                errors.append(ImportRowErrorSchema(line=line, source="", msg=error))
+            else:
+                try:
+                    orders.append(OrderSchema.parse_obj(row))
+                except ValidationError as e:
+                    rejected += 1
+                    errors.extend(ImportRowErrorSchema(line=line, source=separator.join(map(str, error["loc"])),
+                                                       msg=error["msg"]) for error in e.errors())
+            if len(orders) + rejected == size:
+                return orders, errors, rejected
+        return orders or None, errors, rejected
+
+    @staticmethod
+    def _csv_chunk(rows: List[list]) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode()
+
+    async def _evict_order(self, order_id: int):
+        if self.order_cache is not None:
+            key = str(order_id)
+            await self.order_cache.delete(key)
+            # again after commit, a read racing the write may have cached the old row in between
+            await db_session.run_after_commit(lambda: self.order_cache.delete(key))
 
-    async def update_order(self, order_id: int, updated_order: OrderOrm):
-        order: OrderOrm = await self.order_repo.get_by_id(order_id)
-        order.name = updated_order.name
-        order.price = updated_order.price
-        return await self.order_repo.save(order)
+    @staticmethod
+    async def _shared_read(key: Hashable, read: Callable[[], Awaitable[T]]) -> T:
+        """
+        Concurrent identical reads share one query. Reads that must see the request's own writes run alone.
+        Shared results are used by several requests at once, so callers must not modify them.
+        """
+        if get_settings().single_flight_enabled and db_session.can_share_reads():
+            return await order_reads.run(key, lambda: db_session.outside_unit_of_work(read))
+        return await read()
 
-    async def delete_order(self, order_id: int):
-        return await self.order_repo.delete_by_id(order_id)
 
-    async def get_paged_orders(self, pageable: PageRequestSchema) -> Tuple[List, int]:
-        return await self.order_repo.get_paged_items(pageable, {})
+def _is_utf8(value: str) -> bool:
+    try:
+        value.encode("utf-8")
+        return True
+    except UnicodeEncodeError:  # surrogates standing in for bytes that were not utf-8
+        return False
@@ -0,0 +1,96 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, List, Optional, TypeVar
+from weakref import WeakKeyDictionary
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class BatchLoader(Generic[K, V]):
+    """
+    Collects the `load(key)` calls made within `window_seconds` (0 waits for the current loop tick only)
+    and resolves them all with one `load_many(keys)` call, which returns the found values by key.
+    Keys missing from its result fail with `missing(key)`, a failing batch fails every caller in it.
+    A batch is sent early once it holds `max_batch_size` keys. Loaders belong to one event loop, see `get_loader`.
+    """
+
+    def __init__(self, load_many: Callable[[List[K]], Awaitable[Dict[K, V]]], missing: Callable[[K], Exception],
+                 window_seconds: float = 0, max_batch_size: int = 500):
+        self.load_many = load_many
+        self.missing = missing
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self.loads = 0
+        self.batches = 0
+        self._pending: Dict[K, asyncio.Future] = {}
+        self._scheduled: Optional[asyncio.Handle] = None
+
+    async def load(self, key: K) -> V:
+        self.loads += 1
+        future = self._pending.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[key] = future
+            if len(self._pending) >= self.max_batch_size:
+                self._dispatch()
+            elif self._scheduled is None:
+                self._schedule()
+        return await asyncio.shield(future)
+
+    def _schedule(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self.window_seconds > 0:
+            self._scheduled = loop.call_later(self.window_seconds, self._dispatch)
+        else:
+            self._scheduled = loop.call_soon(self._dispatch)
+
+    def _dispatch(self) -> None:
+        if self._scheduled is not None:
+            self._scheduled.cancel()
+            self._scheduled = None
+        batch, self._pending = self._pending, {}
+        self.batches += 1
+        asyncio.ensure_future(self._resolve(batch))
+
+    async def _resolve(self, batch: Dict[K, asyncio.Future]) -> None:
+        try:
+            values = await self.load_many(list(batch))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, future in batch.items():
+            if future.done():
+                continue
+            if key in values:
+                future.set_result(values[key])
+            else:
+                future.set_exception(self.missing(key))
+
+    def stats(self) -> dict:
+        return {
+            "loads": self.loads,
+            "batches": self.batches,
+            "loads_per_batch": self.loads / self.batches if self.batches else None,
+        }
+
+
+_loaders: "WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Hashable, BatchLoader]]" = WeakKeyDictionary()
+
+
+def get_loader(name: Hashable, factory: Callable[[], BatchLoader]) -> BatchLoader:
+    """
+    The loader registered as `name` on the running event loop, created with `factory` on first use.
+    Futures can not be shared between loops, so every loop (worker, test) batches on its own.
+    """
+    loaders = _loaders.setdefault(asyncio.get_running_loop(), {})
+    loader = loaders.get(name)
+    if loader is None:
+        loader = loaders[name] = factory()
+    return loader
+
+
+def loader_stats() -> Dict[str, dict]:
+    loaders = _loaders.get(asyncio.get_running_loop(), {})
+    return {str(name): loader.stats() for name, loader in loaders.items()}
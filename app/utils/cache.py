@@ -0,0 +1,127 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend:
+    """
+    Byte-valued cache with hit/miss/eviction counters. Values are serialized by the caller
+    so the in-process and Redis backends are interchangeable.
+    """
+
+    def __init__(self, namespace: str, ttl_seconds: int):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError()
+
+    async def set(self, key: str, value: bytes) -> None:
+        raise NotImplementedError()
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else None,
+        }
+
+
+class MemoryCache(CacheBackend):
+    """
+    In-process LRU with a TTL per entry, bounded by entry count and by the total size of keys and values.
+    """
+
+    def __init__(self, namespace: str, ttl_seconds: int, max_bytes: int, max_entries: int = 100_000):
+        super().__init__(namespace, ttl_seconds)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.size_bytes = 0
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    async def set(self, key: str, value: bytes) -> None:
+        if key in self._entries:
+            self._remove(key)
+        if len(key) + len(value) > self.max_bytes:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self.size_bytes += len(key) + len(value)
+        while self.size_bytes > self.max_bytes or len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def delete(self, key: str) -> None:
+        if key in self._entries:
+            self._remove(key)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "entries": len(self._entries), "size_bytes": self.size_bytes}
+
+    def _remove(self, key: str) -> None:
+        _, value = self._entries.pop(key)
+        self.size_bytes -= len(key) + len(value)
+
+
+class RedisCache(CacheBackend):
+    """
+    Cache on any server speaking the Redis protocol. `client` needs async get/set(px=)/delete,
+    which `redis.asyncio` provides; tests can pass a local stand-in. Memory is bounded by the server's maxmemory.
+    """
+
+    def __init__(self, namespace: str, ttl_seconds: int, client=None, url: str = None):
+        super().__init__(namespace, ttl_seconds)
+        if client is None:
+            try:
+                import redis.asyncio
+            except ImportError:
+                raise ImportError("the redis cache backend requires the `redis` package (poetry install -E cache)")
+            client = redis.asyncio.from_url(url)
+        self.client = client
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value = await self.client.get(self._key(key))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: bytes) -> None:
+        await self.client.set(self._key(key), value, px=self.ttl_seconds * 1000)
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(self._key(key))
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+
+def build_cache(backend: str, namespace: str, ttl_seconds: int, max_bytes: int, url: str) -> Optional[CacheBackend]:
+    if backend == "memory":
+        return MemoryCache(namespace, ttl_seconds, max_bytes)
+    if backend == "redis":
+        return RedisCache(namespace, ttl_seconds, url=url)
+    return None
@@ -0,0 +1,148 @@
+import gzip
+import zlib
+from typing import Dict, Optional, List
+
+try:
+    import brotli
+except ImportError:  # poetry install -E compression
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # poetry install -E compression
+    zstandard = None
+
+
+class StreamCompressor:
+    """
+    Compresses a body sent in chunks. Every chunk is flushed, so clients can decode each one as it arrives.
+    """
+
+    def compress(self, chunk: bytes) -> bytes:
+        raise NotImplementedError()
+
+    def finish(self) -> bytes:
+        raise NotImplementedError()
+
+
+class Codec:
+    encoding: str = None
+
+    def __init__(self, level: int):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError()
+
+    def stream(self) -> StreamCompressor:
+        raise NotImplementedError()
+
+
+class _GzipStream(StreamCompressor):
+    def __init__(self, level: int):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self.compressor.compress(chunk) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self.compressor.flush()
+
+
+class GzipCodec(Codec):
+    encoding = "gzip"
+
+    def compress(self, data: bytes) -> bytes:
+        return gzip.compress(data, self.level, mtime=0)
+
+    def stream(self) -> StreamCompressor:
+        return _GzipStream(self.level)
+
+
+class _BrotliStream(StreamCompressor):
+    def __init__(self, quality: int):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self.compressor.process(chunk) + self.compressor.flush()
+
+    def finish(self) -> bytes:
+        return self.compressor.finish()
+
+
+class BrotliCodec(Codec):
+    encoding = "br"
+
+    def compress(self, data: bytes) -> bytes:
+        return brotli.compress(data, quality=self.level)
+
+    def stream(self) -> StreamCompressor:
+        return _BrotliStream(self.level)
+
+
+class _ZstdStream(StreamCompressor):
+    def __init__(self, compressor: "zstandard.ZstdCompressor"):
+        self.compressor = compressor.compressobj()
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self.compressor.compress(chunk) + self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self.compressor.flush()
+
+
+class ZstdCodec(Codec):
+    encoding = "zstd"
+
+    def __init__(self, level: int):
+        super().__init__(level)
+        self.compressor = zstandard.ZstdCompressor(level=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data)
+
+    def stream(self) -> StreamCompressor:
+        return _ZstdStream(self.compressor)
+
+
+def build_codecs(encodings: List[str], gzip_level: int, brotli_quality: int, zstd_level: int) -> List[Codec]:
+    """
+    Codecs for `encodings` in the server's order of preference, skipping those whose package is not installed.
+    """
+    codecs = {
+        "gzip": lambda: GzipCodec(gzip_level),
+        "br": lambda: BrotliCodec(brotli_quality) if brotli is not None else None,
+        "zstd": lambda: ZstdCodec(zstd_level) if zstandard is not None else None,
+    }
+    built = [codecs[encoding]() for encoding in encodings if encoding in codecs]
+    return [codec for codec in built if codec is not None]
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    accepted = {}
+    for item in header.split(","):
+        encoding, *params = item.strip().split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if encoding:
+            accepted[encoding.strip().lower()] = quality
+    return accepted
+
+
+def negotiate(accept_encoding: Optional[str], codecs: List[Codec]) -> Optional[Codec]:
+    """
+    The first codec the client accepts, in the server's order of preference. `*` covers encodings not listed.
+    """
+    if not accept_encoding:
+        return None
+    accepted = parse_accept_encoding(accept_encoding)
+    for codec in codecs:
+        if accepted.get(codec.encoding, accepted.get("*", 0)) > 0:
+            return codec
+    return None
@@ -0,0 +1,55 @@
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Hashable, Optional, Tuple, Set
+
+from app.config.settings import get_settings
+
+
+class CountCache:
+    """
+    Memoizes exact `count(*)` results per table and filter for a short TTL.
+    Entries are grouped by table so a write can drop every count for that table at once.
+    Filters come from requests, so the cache is an LRU bounded to `max_entries`.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int = 10_000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[float, int]]" = OrderedDict()
+        self._tables: Dict[str, Set[Hashable]] = {}
+
+    def get(self, table: str, key: Hashable) -> Optional[int]:
+        entry = self._entries.get((table, key))
+        if entry is None:
+            return None
+        expires_at, count = entry
+        if expires_at < time.monotonic():
+            self._remove(table, key)
+            return None
+        self._entries.move_to_end((table, key))
+        return count
+
+    def set(self, table: str, key: Hashable, count: int) -> None:
+        self._entries[(table, key)] = (time.monotonic() + self.ttl_seconds, count)
+        self._entries.move_to_end((table, key))
+        self._tables.setdefault(table, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(*next(iter(self._entries)))
+
+    def invalidate(self, table: str) -> None:
+        for key in self._tables.pop(table, ()):
+            del self._entries[(table, key)]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, table: str, key: Hashable) -> None:
+        del self._entries[(table, key)]
+        self._tables[table].discard(key)
+
+
+@lru_cache(maxsize=1)
+def get_count_cache() -> CountCache:
+    settings = get_settings()
+    return CountCache(settings.count_cache_ttl_seconds, settings.count_cache_max_entries)
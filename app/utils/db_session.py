@@ -1,26 +1,327 @@
-from contextlib import asynccontextmanager
+import asyncio
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager, AsyncExitStack
+from contextvars import ContextVar
+from typing import Optional, List, Dict, Callable, Awaitable, Sequence, TypeVar
 
-from sqlalchemy import AsyncAdaptedQueuePool
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, AsyncSession
+import backoff
+from sqlalchemy import AsyncAdaptedQueuePool, text, event
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, AsyncSession, AsyncEngine
 
 from app.config.settings import get_database_settings
+from app.utils import server_timing
+from app.utils.metrics import registry
+from app.utils.query_stats import record_query
 
-async_url = get_database_settings().async_url
-engine = create_async_engine(async_url,
-                             pool_pre_ping=True,
-                             poolclass=AsyncAdaptedQueuePool,
-                             pool_size=1,
-                             max_overflow=1)
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+database_settings = get_database_settings()
+async_url = database_settings.async_url
+
+
+def _create_engine(url: str) -> AsyncEngine:
+    return create_async_engine(url,
+                               pool_pre_ping=database_settings.pool_pre_ping,
+                               poolclass=AsyncAdaptedQueuePool,
+                               pool_size=database_settings.pool_size,
+                               max_overflow=database_settings.max_overflow,
+                               pool_timeout=database_settings.pool_timeout_seconds,
+                               pool_recycle=database_settings.pool_recycle_seconds,
+                               connect_args={
+                                   "statement_cache_size": database_settings.statement_cache_size,
+                                   "prepared_statement_cache_size": database_settings.prepared_statement_cache_size,
+                               })
+
+
+db_query_duration = registry.histogram("db_query_duration_seconds", "SQL statement execution time", ["database"])
+db_pool_connections = registry.gauge("db_pool_connections", "Pooled connections by state", ["database", "state"])
+checkout_wait = registry.histogram("db_pool_checkout_wait_seconds", "Time waited for a pooled connection").labels()
+
+
+def _track_queries(pool_engine: AsyncEngine, database: str) -> None:
+    histogram = db_query_duration.labels(database)
+
+    @event.listens_for(pool_engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_started_at"] = time.perf_counter()
+
+    @event.listens_for(pool_engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["query_started_at"]
+        histogram.observe(duration)
+        record_query(statement, parameters, duration)
+
+
+engine = _create_engine(async_url)
 sessionmaker = async_sessionmaker(bind=engine, expire_on_commit=False)
+_track_queries(engine, "primary")
+
+
+def _database_label(pool_engine: AsyncEngine) -> str:
+    return "primary" if pool_engine is engine else f"{pool_engine.url.host}:{pool_engine.url.port}"
+
+
+class ReplicaSet:
+    """
+    Read replicas in selection order. A replica that fails to hand out a connection is skipped
+    for `replica_retry_seconds`, and reads fall back to the primary when no replica is usable.
+    """
+
+    def __init__(self, engines: List[AsyncEngine], selection: str, retry_seconds: int):
+        self.engines = engines
+        self.selection = selection
+        self.retry_seconds = retry_seconds
+        self._down_until: Dict[AsyncEngine, float] = {}
+        self._round_robin = itertools.count()
+
+    def candidates(self) -> List[AsyncEngine]:
+        now = time.monotonic()
+        healthy = [replica for replica in self.engines if self._down_until.get(replica, 0) <= now]
+        if not healthy:
+            return []
+        if self.selection == "least_busy":
+            return sorted(healthy, key=lambda replica: replica.sync_engine.pool.checkedout())
+        start = next(self._round_robin) % len(healthy)
+        return healthy[start:] + healthy[:start]
+
+    def mark_down(self, replica: AsyncEngine) -> None:
+        logger.warning(f"Replica {_database_label(replica)} is unavailable, reading from the next one")
+        self._down_until[replica] = time.monotonic() + self.retry_seconds
+
+
+replicas = ReplicaSet([_create_engine(url) for url in database_settings.replica_urls],
+                      database_settings.replica_selection,
+                      database_settings.replica_retry_seconds)
+for _replica in replicas.engines:
+    _track_queries(_replica, _database_label(_replica))
+_prefer_primary: ContextVar[bool] = ContextVar("prefer_primary", default=False)
+
+
+async def _checkout(session: AsyncSession) -> None:
+    """
+    Checks out the session's connection up front so the time spent waiting on the pool is recorded.
+    """
+    start = time.perf_counter()
+    await session.connection()
+    elapsed = time.perf_counter() - start
+    checkout_wait.observe(elapsed)
+    server_timing.record("pool", elapsed)
+
+
+class UnitOfWork:
+    """
+    One session and one transaction shared by every repository call made while handling a request.
+    The session is opened lazily, so requests that never touch the database never check out a connection.
+    """
+
+    def __init__(self):
+        self.session: Optional[AsyncSession] = None
+        self.completed = False
+        self.after_commit: List[Callable[[], Awaitable]] = []
+
+    async def get_session(self) -> AsyncSession:
+        if self.session is None:
+            self.session = sessionmaker()
+            await self.session.begin()
+            await _checkout(self.session)
+        return self.session
+
+    async def complete(self, commit: bool) -> None:
+        if self.completed:
+            return
+        self.completed = True
+        if self.session is not None:
+            if commit:
+                await self.session.commit()
+                for callback in self.after_commit:
+                    try:
+                        await callback()
+                    except Exception:
+                        logger.exception("after commit callback failed")
+            else:
+                await self.session.rollback()
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+
+
+_unit_of_work: ContextVar[Optional[UnitOfWork]] = ContextVar("unit_of_work", default=None)
+
+
+@asynccontextmanager
+async def unit_of_work(prefer_primary: bool = False) -> UnitOfWork:
+    uow = UnitOfWork()
+    token = _unit_of_work.set(uow)
+    primary_token = _prefer_primary.set(prefer_primary)
+    try:
+        yield uow
+    finally:
+        try:
+            await uow.complete(commit=False)
+        finally:
+            await uow.close()
+            _prefer_primary.reset(primary_token)
+            _unit_of_work.reset(token)
+
+
+def can_share_reads() -> bool:
+    """
+    True when the current reads may be served by work shared with other requests,
+    meaning the request neither prefers the primary nor already holds a transaction its reads must see.
+    """
+    uow = _unit_of_work.get()
+    return not _prefer_primary.get() and (uow is None or uow.session is None)
+
+
+async def outside_unit_of_work(work: Callable[[], Awaitable[T]]) -> T:
+    """
+    Runs `work` with sessions of its own instead of the request's, for reads whose results are shared with other requests.
+    """
+    token = _unit_of_work.set(None)
+    try:
+        return await work()
+    finally:
+        _unit_of_work.reset(token)
+
+
+async def run_after_commit(callback: Callable[[], Awaitable]) -> None:
+    """
+    Runs `callback` once the request's transaction commits, or right away outside a request.
+    """
+    uow = _unit_of_work.get()
+    if uow is not None and uow.session is not None and not uow.completed:
+        uow.after_commit.append(callback)
+    else:
+        await callback()
 
 
 @asynccontextmanager
 async def get_db_session() -> AsyncSession:
+    uow = _unit_of_work.get()
+    if uow is not None and not uow.completed:
+        session = await uow.get_session()
+        yield session
+        await session.flush()  # surface db errors in the repository call like a commit would
+        return
+
     session = sessionmaker()
     async with session.begin():
+        await _checkout(session)
         yield session
 
 
+@asynccontextmanager
+async def get_read_session() -> AsyncSession:
+    """
+    Session for reads that may be served by a replica. Reads stay on the primary when no replica is configured,
+    when the request prefers it (writes, read-your-writes window) or when the request already holds a primary session.
+    """
+    uow = _unit_of_work.get()
+    in_transaction = uow is not None and uow.session is not None and not uow.completed
+    if not replicas.engines or _prefer_primary.get() or in_transaction:
+        async with get_db_session() as session:
+            yield session
+        return
+
+    for replica in replicas.candidates():
+        session = sessionmaker(bind=replica)
+        try:
+            await session.begin()
+            await _checkout(session)
+        except (OSError, asyncio.TimeoutError, SQLAlchemyError):
+            await session.close()
+            replicas.mark_down(replica)
+            continue
+        try:
+            yield session
+        finally:
+            await session.close()
+        return
+
+    async with get_db_session() as session:
+        yield session
+
+
+async def wait_until_ready(retry_window_seconds: float) -> None:
+    """
+    Pings the primary through the pool, retrying with exponential backoff until `retry_window_seconds` have passed.
+    The ping is the pool's first connection, so the dialect is initialized before any connects run concurrently.
+    The last error is raised when the database is still unreachable at the end of the window.
+    """
+
+    @backoff.on_exception(backoff.expo, (OSError, asyncio.TimeoutError, SQLAlchemyError),
+                          max_time=retry_window_seconds, max_value=5, logger=logger)
+    async def ping():
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    await ping()
+    logger.info("Connected to postgres")
+
+
+async def warm_up(statements: Sequence = ()) -> None:
+    """
+    Opens `pool_size` connections and returns them to the pool so the first requests skip the TCP and auth handshake.
+    Each connection runs `statements` once, so they are compiled and prepared before the first request needs them.
+    Connections are opened one at a time, concurrent first connects can deadlock in SQLAlchemy's first-connect hook.
+    A replica that can not be reached is marked down, reads use the other replicas or the primary until it is back.
+    """
+    await _warm_up_pool(engine, statements)
+    for replica in replicas.engines:
+        try:
+            await _warm_up_pool(replica, statements)
+        except (OSError, asyncio.TimeoutError, SQLAlchemyError):
+            replicas.mark_down(replica)
+
+
+async def _warm_up_pool(pool_engine: AsyncEngine, statements: Sequence) -> None:
+    async with AsyncExitStack() as stack:
+        for _ in range(database_settings.pool_size):
+            connection = await stack.enter_async_context(pool_engine.connect())
+            if statements:
+                async with sessionmaker(bind=connection) as session:
+                    for statement in statements:
+                        await session.execute(statement)
+                    await session.rollback()
+
+
+def pool_stats() -> dict:
+    pool = engine.sync_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "max_overflow": database_settings.max_overflow,
+        "checkout_wait_seconds": checkout_wait.snapshot(),
+    }
+
+
+def _collect_pool_metrics() -> None:
+    for pool_engine in [engine] + replicas.engines:
+        pool = pool_engine.sync_engine.pool
+        database = _database_label(pool_engine)
+        db_pool_connections.labels(database, "checked_in").set(pool.checkedin())
+        db_pool_connections.labels(database, "checked_out").set(pool.checkedout())
+        db_pool_connections.labels(database, "overflow").set(max(pool.overflow(), 0))
+        db_pool_connections.labels(database, "size").set(pool.size())
+
+
+registry.add_collector(_collect_pool_metrics)
+
+
 async def shutdown() -> None:
+    """
+    Closes the pools. SQLAlchemy replaces a disposed pool with a new one whose first connect is guarded by a
+    threading lock, so an engine used again after shutdown needs `wait_until_ready` before connecting concurrently.
+    """
     if engine is not None:
         await engine.dispose()
+    for replica in replicas.engines:
+        await replica.dispose()
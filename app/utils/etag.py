@@ -0,0 +1,70 @@
+import hashlib
+from datetime import datetime, timezone, timedelta
+from typing import Optional, List, Tuple, Iterable
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class PreconditionFailedError(Exception):
+    pass
+
+
+def entity_etag(entity_id: int, updated_at: datetime) -> str:
+    """
+    Strong ETag of one row version, `"<id>-<updated_at in microseconds since the epoch>"`
+    """
+    return f'"{entity_id}-{(updated_at - EPOCH) // MICROSECOND}"'
+
+
+def coded_etag(etag: str, encoding: str) -> str:
+    """
+    Strong ETag of `etag`'s representation sent with the `encoding` content coding, `"<opaque>-<encoding>"`.
+    Strong tags promise byte-identical bodies, so each coding needs its own.
+    """
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def strip_coding(tag: str) -> str:
+    """
+    `tag` without the content coding suffix added by `coded_etag`, the tag of the version itself.
+    """
+    opaque, separator, encoding = tag.rpartition("-")
+    return f'{opaque}"' if separator and encoding.endswith('"') and encoding[:-1].isalpha() else tag
+
+
+def parse_entity_etags(header: str) -> List[Tuple[int, datetime]]:
+    """
+    The row versions listed in an `If-Match` header, weak and foreign tags are skipped since they never match.
+    """
+    versions = []
+    for tag in header.split(","):
+        tag = strip_coding(tag.strip())
+        entity_id, _, micros = tag.strip('"').partition("-")
+        if tag.startswith('"') and entity_id.isdigit() and micros.isdigit():
+            versions.append((int(entity_id), EPOCH + int(micros) * MICROSECOND))
+    return versions
+
+
+def page_etag(rows: Iterable, *parts) -> str:
+    """
+    Weak ETag of a page, derived from the version of every row on it plus `parts` like totals and cursors.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for row in rows:
+        digest.update(f"{row.id}-{(row.updated_at - EPOCH) // MICROSECOND},".encode())
+    digest.update(repr(parts).encode())
+    return f'W/"{digest.hexdigest()}"'
+
+
+def none_match(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    False when `If-None-Match` lists `etag` in any content coding (weak comparison) or is `*`,
+    the client's copy is current then.
+    """
+    if if_none_match is None:
+        return True
+    if if_none_match.strip() == "*":
+        return False
+    opaque = etag.removeprefix("W/")
+    return all(strip_coding(tag.strip().removeprefix("W/")) != opaque for tag in if_none_match.split(","))
@@ -0,0 +1,73 @@
+"""
+Import time per module for a cold start of the app, in the style of `python -X importtime`.
+
+    python -m app.utils.import_profiler [--module app.main] [--budget-ms 1000] [--top 25] [--runs 3]
+
+Each run imports the module in a fresh interpreter, the fastest run is reported to keep noise down.
+Exits with status 1 when the module's cumulative import time is over the budget.
+"""
+import argparse
+import subprocess
+import sys
+from typing import List, NamedTuple
+
+from app.config.settings import get_settings
+
+
+class ImportTime(NamedTuple):
+    module: str
+    depth: int
+    self_us: int
+    cumulative_us: int
+
+
+def parse_importtime(output: str) -> List[ImportTime]:
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append(ImportTime(name.strip(), depth, int(self_us), int(cumulative_us)))
+    return imports
+
+
+def profile_imports(module: str) -> List[ImportTime]:
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    return parse_importtime(result.stderr)
+
+
+def total_us(imports: List[ImportTime], module: str) -> int:
+    return next(entry.cumulative_us for entry in imports if entry.module == module and entry.depth == 0)
+
+
+def report(imports: List[ImportTime], module: str, top: int) -> str:
+    lines = ["import time: self [us] | cumulative | imported package"]
+    for entry in sorted(imports, key=lambda entry: entry.cumulative_us, reverse=True)[:top]:
+        lines.append(f"import time: {entry.self_us:>9} | {entry.cumulative_us:>10} | {'  ' * entry.depth}{entry.module}")
+    lines.append(f"{module}: {total_us(imports, module) / 1000:.1f}ms over {len(imports)} modules")
+    return "\n".join(lines)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=get_settings().import_budget_ms)
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    imports = min((profile_imports(args.module) for _ in range(args.runs)),
+                  key=lambda run: total_us(run, args.module))
+    print(report(imports, args.module, args.top))
+
+    elapsed_ms = total_us(imports, args.module) / 1000
+    if elapsed_ms > args.budget_ms:
+        print(f"{args.module} took {elapsed_ms:.1f}ms to import, over the {args.budget_ms:.0f}ms budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
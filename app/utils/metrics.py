@@ -0,0 +1,124 @@
+from bisect import bisect_left
+from typing import Sequence, List, Callable, Dict, Tuple, Any
+
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. `observe` only increments counters so it is cheap enough for hot paths.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> dict:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+        return {"buckets": buckets, "sum": self.sum, "count": self.count}
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class MetricFamily:
+    """
+    One metric name with a child histogram or gauge per combination of label values.
+    Children are created on first use, callers on hot paths should keep the child instead of looking it up again.
+    """
+
+    def __init__(self, name: str, help_text: str, kind: str, label_names: Sequence[str], factory: Callable):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self.factory = factory
+        self.children: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, *values: str):
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self.factory()
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self.children.items():
+            labels = [f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, values)]
+            if self.kind == "histogram":
+                for bound, count in child.snapshot()["buckets"].items():
+                    bucket_labels = labels + [f'le="{bound}"']
+                    lines.append(f"{self.name}_bucket{_labels(bucket_labels)} {count}")
+                lines.append(f"{self.name}_sum{_labels(labels)} {child.sum}")
+                lines.append(f"{self.name}_count{_labels(labels)} {child.count}")
+            else:
+                lines.append(f"{self.name}{_labels(labels)} {child.value}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Metrics of this process in the Prometheus text format. Collectors run on every scrape,
+    for values that are cheaper to read when asked for (pool stats) than to track on every change.
+    """
+
+    def __init__(self):
+        self.families: Dict[str, MetricFamily] = {}
+        self.collectors: List[Callable[[], None]] = []
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> MetricFamily:
+        return self._family(name, help_text, "histogram", label_names, lambda: Histogram(buckets))
+
+    def gauge(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> MetricFamily:
+        return self._family(name, help_text, "gauge", label_names, Gauge)
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            collector()
+        lines = []
+        for family in self.families.values():
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+    def _family(self, name, help_text, kind, label_names, factory) -> MetricFamily:
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = MetricFamily(name, help_text, kind, label_names, factory)
+        return family
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: List[str]) -> str:
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+registry = MetricsRegistry()
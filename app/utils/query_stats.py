@@ -0,0 +1,100 @@
+import functools
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Callable
+
+from app.config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceededError(Exception):
+    pass
+
+
+class QueryStats:
+    """
+    Statements executed and time spent in them while the stats are current. Nested stats
+    (an endpoint's budget inside the request) also count towards their parent.
+    """
+
+    __slots__ = ("count", "duration", "parent")
+
+    def __init__(self, parent: Optional["QueryStats"] = None):
+        self.count = 0
+        self.duration = 0.0
+        self.parent = parent
+
+    def record(self, duration: float) -> None:
+        stats = self
+        while stats is not None:
+            stats.count += 1
+            stats.duration += duration
+            stats = stats.parent
+
+
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _query_stats.get()
+
+
+@contextmanager
+def track_queries() -> QueryStats:
+    stats = QueryStats(parent=_query_stats.get())
+    token = _query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _query_stats.reset(token)
+
+
+def record_query(statement: str, parameters, duration: float) -> None:
+    """
+    Called for every executed statement, counts it for the current request and logs it when slow.
+    Parameters are logged by type only, they can hold personal data.
+    """
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.record(duration)
+    slow_query_ms = get_settings().slow_query_ms
+    if slow_query_ms and duration * 1000 >= slow_query_ms:
+        logger.warning(f"Slow query took {duration * 1000:.1f}ms: {statement} parameters: {redact(parameters)}")
+
+
+def redact(parameters) -> str:
+    if isinstance(parameters, list) and parameters and isinstance(parameters[0], (tuple, list, dict)):
+        return f"{len(parameters)} parameter sets"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    return "(" + ", ".join(type(value).__name__ for value in parameters or ()) + ")"
+
+
+def query_budget(max_queries: int) -> Callable:
+    """
+    Declares how many statements an endpoint may execute. Over budget, the endpoint logs a warning
+    or fails with QueryBudgetExceededError depending on `query_budget_mode`, which catches N+1 patterns
+    in dev and tests before they reach production.
+    """
+
+    def decorator(endpoint: Callable) -> Callable:
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            mode = get_settings().query_budget_mode
+            if mode == "off":
+                return await endpoint(*args, **kwargs)
+
+            with track_queries() as stats:
+                result = await endpoint(*args, **kwargs)
+            if stats.count > max_queries:
+                message = f"{endpoint.__qualname__} executed {stats.count} queries, its budget is {max_queries}"
+                if mode == "raise":
+                    raise QueryBudgetExceededError(message)
+                logger.warning(message)
+            return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,55 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict
+
+PHASES = ("pool", "orm", "serialize", "encode")
+
+
+class ServerTiming:
+    """
+    Time spent per phase of one request, summed over every time the phase ran.
+    """
+
+    __slots__ = ("durations",)
+
+    def __init__(self):
+        self.durations: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.durations[phase] += seconds
+
+
+_server_timing: ContextVar[Optional[ServerTiming]] = ContextVar("server_timing", default=None)
+
+
+@contextmanager
+def collect_server_timing() -> ServerTiming:
+    timing = ServerTiming()
+    token = _server_timing.set(timing)
+    try:
+        yield timing
+    finally:
+        _server_timing.reset(token)
+
+
+def record(phase: str, seconds: float) -> None:
+    timing = _server_timing.get()
+    if timing is not None:
+        timing.add(phase, seconds)
+
+
+@contextmanager
+def timed(phase: str):
+    """
+    Adds the time spent in the block to `phase` of the current request, when Server-Timing is on.
+    """
+    timing = _server_timing.get()
+    if timing is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(phase, time.perf_counter() - start)
@@ -0,0 +1,35 @@
+from typing import Dict, Optional, Sequence
+
+from opentelemetry.context import Context
+from opentelemetry.sdk.trace.sampling import Sampler, SamplingResult, TraceIdRatioBased
+from opentelemetry.semconv.trace import SpanAttributes
+from opentelemetry.trace import Link, SpanKind
+from opentelemetry.trace.span import TraceState
+from opentelemetry.util.types import Attributes
+
+
+class RouteRatioSampler(Sampler):
+    """
+    Samples new traces at the ratio configured for the longest matching request path prefix,
+    or at `default_ratio` for other paths and for spans started outside a request.
+    Meant as the root of a `ParentBased` sampler, so child spans (SQL statements) follow their request.
+    """
+
+    def __init__(self, default_ratio: float, route_ratios: Dict[str, float]):
+        self._default = TraceIdRatioBased(default_ratio)
+        self._routes = sorted(((prefix, TraceIdRatioBased(ratio)) for prefix, ratio in route_ratios.items()),
+                              key=lambda route: len(route[0]), reverse=True)
+
+    def should_sample(self, parent_context: Optional[Context], trace_id: int, name: str,
+                      kind: SpanKind = None, attributes: Attributes = None, links: Sequence[Link] = None,
+                      trace_state: TraceState = None) -> SamplingResult:
+        sampler = self._default
+        path = attributes.get(SpanAttributes.HTTP_TARGET) if attributes else None
+        if path is not None:
+            sampler = next((route_sampler for prefix, route_sampler in self._routes if path.startswith(prefix)),
+                           self._default)
+        return sampler.should_sample(parent_context, trace_id, name, kind, attributes, links, trace_state)
+
+    def get_description(self) -> str:
+        routes = ",".join(f"{prefix}={sampler.rate}" for prefix, sampler in self._routes)
+        return f"RouteRatioSampler{{default={self._default.rate},routes={{{routes}}}}}"
@@ -0,0 +1,26 @@
+import time
+
+import pytest
+from httpx import AsyncClient
+
+from tests.integrations.test_order_controller import get_address_dict, get_order_dict
+
+pytestmark = pytest.mark.benchmark
+
+
+class TestBatchBenchmark:
+    async def test_batch_insert_throughput(self, async_client: AsyncClient):
+        order_dict = get_order_dict(get_address_dict())
+
+        start_time = time.perf_counter()
+        for _ in range(200):
+            await async_client.post("/order", json=order_dict)
+        single_rate = 200 / (time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        response = await async_client.post("/orders/batch", json=[order_dict] * 5000)
+        batch_rate = 5000 / (time.perf_counter() - start_time)
+
+        print(f"POST /order: {single_rate:.0f} orders/s, POST /orders/batch: {batch_rate:.0f} orders/s")
+        assert response.json()["created_count"] == 5000
+        assert batch_rate > single_rate
@@ -0,0 +1,59 @@
+import time
+
+import pytest
+from httpx import AsyncClient
+from starlette.responses import Response
+
+from app.middleware.compression_middleware import CompressionMiddleware
+from app.utils.compression import GzipCodec, BrotliCodec, ZstdCodec, brotli, zstandard
+from tests.integrations.test_order_controller import get_address_dict, get_order_dict
+
+pytestmark = pytest.mark.benchmark
+
+
+def time_compress(codec, body, runs=50):
+    codec.compress(body)  # warm up
+    start_time = time.perf_counter()
+    for _ in range(runs):
+        compressed = codec.compress(body)
+    return (time.perf_counter() - start_time) / runs, len(compressed)
+
+
+class TestCompressionBenchmark:
+    async def test_page_compression(self, async_client: AsyncClient):
+        for _ in range(100):
+            await async_client.post("/order", json=get_order_dict(get_address_dict()))
+        response = await async_client.get("/orders?size=100", headers={"Accept-Encoding": "identity"})
+        body = response.content
+
+        codecs = [GzipCodec(1), GzipCodec(6), GzipCodec(9)]
+        if brotli is not None:
+            codecs += [BrotliCodec(1), BrotliCodec(4), BrotliCodec(11)]
+        if zstandard is not None:
+            codecs += [ZstdCodec(1), ZstdCodec(3), ZstdCodec(19)]
+
+        print(f"\nGET /orders?size=100: {len(body)} bytes uncompressed")
+        for codec in codecs:
+            duration, size = time_compress(codec, body)
+            print(f"{codec.encoding:>4} level {codec.level:>2}: {size:>6} bytes ({len(body) / size:4.1f}x), "
+                  f"{duration * 1e6:6.0f}us per response, {len(body) / duration / 1e6:6.0f} MB/s")
+            assert size < len(body) / 5
+
+    async def test_precompressed_cache(self):
+        body = b'{"name": "ipad", "price": 712.54}' * 1000
+
+        async def app(scope, receive, send):
+            await Response(body, media_type="application/json", headers={"ETag": '"1-1"'})(scope, receive, send)
+
+        middleware = CompressionMiddleware(app)
+        async with AsyncClient(app=middleware, base_url="http://test") as client:
+            start_time = time.perf_counter()
+            first = await client.get("/order/1", headers={"Accept-Encoding": "gzip"})
+            first_time = time.perf_counter() - start_time
+            start_time = time.perf_counter()
+            second = await client.get("/order/1", headers={"Accept-Encoding": "gzip"})
+            second_time = time.perf_counter() - start_time
+
+        print(f"\n{len(body)} bytes, compressed {first_time * 1e6:.0f}us, from cache {second_time * 1e6:.0f}us")
+        assert first.content == second.content == body
+        assert middleware.cache.stats()["hits"] == 1
@@ -0,0 +1,65 @@
+import time
+
+import pytest
+
+from app.models.base import BaseOrm, BaseSchema
+from app.models.order import OrderSchema
+from tests.benchmarks.test_serialization_benchmark import get_order_orms
+from tests.integrations.test_order_controller import get_address_dict, get_order_dict
+
+pytestmark = pytest.mark.benchmark
+
+
+def legacy_to_orm(schema):
+    """
+    BaseSchema.to_orm before conversion plans, kept for comparison
+    """
+    orm = schema.__orm__()
+
+    def set_val(key, data):
+        if (isinstance(data, BaseOrm) or isinstance(data, list)) and key not in schema.__transient_fields__:
+            setattr(orm, key, data)
+        else:
+            for key, value in data:
+                try:
+                    if isinstance(value, list):
+                        set_val(key, [legacy_to_orm(item) for item in value if isinstance(item, BaseSchema)])
+                    elif isinstance(value, BaseSchema) and key not in schema.__transient_fields__:
+                        setattr(orm, key, legacy_to_orm(value))
+                    elif value is not None and key not in schema.__transient_fields__:
+                        setattr(orm, key, value)
+                except AttributeError:
+                    pass
+
+    set_val(None, schema)
+
+    return orm
+
+
+def time_per_call(fn, arg, runs=2000):
+    fn(arg)  # warm up, plans are built on first use
+    start_time = time.process_time()
+    for _ in range(runs):
+        fn(arg)
+    return (time.process_time() - start_time) / runs
+
+
+class TestConversionBenchmark:
+    def test_order_schema_conversion(self):
+        order = OrderSchema.parse_obj(get_order_dict(get_address_dict()))
+        order_orm = get_order_orms(1)[0]
+
+        to_orm_legacy = time_per_call(legacy_to_orm, order)
+        to_orm = time_per_call(OrderSchema.to_orm, order)
+        from_orm = time_per_call(OrderSchema.from_orm, order_orm)
+        from_orm_fast = time_per_call(OrderSchema.from_orm_fast, order_orm)
+
+        print(f"to_orm: legacy {to_orm_legacy * 1e6:.1f}us, planned {to_orm * 1e6:.1f}us | "
+              f"from_orm: pydantic {from_orm * 1e6:.1f}us, fast {from_orm_fast * 1e6:.1f}us")
+        legacy, planned = legacy_to_orm(order), order.to_orm()
+        assert [planned.name, planned.price, planned.pickup_address.city, planned.dropoff_address.latitude] == \
+               [legacy.name, legacy.price, legacy.pickup_address.city, legacy.dropoff_address.latitude]
+        assert planned.id is None and planned.pickup_address.id is None
+        assert OrderSchema.from_orm_fast(order_orm) == OrderSchema.from_orm(order_orm)
+        assert to_orm < to_orm_legacy
+        assert from_orm_fast < from_orm
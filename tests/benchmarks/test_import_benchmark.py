@@ -0,0 +1,12 @@
+from app.config.settings import get_settings
+from app.utils.import_profiler import profile_imports, total_us, report
+
+
+# not marked as a benchmark, the import budget guards every test run
+class TestImportBenchmark:
+    def test_app_import_time(self):
+        imports = profile_imports("app.main")
+
+        print(report(imports, "app.main", top=10))
+        assert not [entry.module for entry in imports if entry.module.startswith("opentelemetry")]
+        assert total_us(imports, "app.main") / 1000 < get_settings().import_budget_ms
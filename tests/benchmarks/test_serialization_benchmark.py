@@ -0,0 +1,54 @@
+import json
+import time
+from datetime import datetime, timezone
+
+import orjson
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+from app.models.address import AddressOrm
+from app.models.order import OrderOrm, OrderSchema
+from app.models.pageable import PageResponseSchema
+from tests.integrations.test_order_controller import get_address_dict
+
+pytestmark = pytest.mark.benchmark
+
+
+def get_order_orms(count):
+    now = datetime.now(timezone.utc)
+    orders = []
+    for i in range(count):
+        pickup = AddressOrm(id=i * 2, created_at=now, updated_at=now, **get_address_dict())
+        dropoff = AddressOrm(id=i * 2 + 1, created_at=now, updated_at=now, **get_address_dict())
+        orders.append(OrderOrm(id=i, created_at=now, updated_at=now, order_number="ABC123", name="ipad",
+                               price=712.54, pickup_address=pickup, dropoff_address=dropoff))
+    return orders
+
+
+def pydantic_page(orders):
+    page = PageResponseSchema(data=[OrderSchema.from_orm(orm) for orm in orders], total_count=10000, page_size=500)
+    page = PageResponseSchema.validate(page)  # fastapi re-validates the returned model into the response model
+    return json.dumps(jsonable_encoder(page), separators=(",", ":")).encode()
+
+
+def fast_page(orders):
+    page = PageResponseSchema(data=orders, total_count=10000, page_size=500)
+    content = {key: getattr(page, key) for key in page.__fields__}
+    content["data"] = [OrderSchema.dump_orm(orm) for orm in orders]
+    return orjson.dumps(content)
+
+
+class TestSerializationBenchmark:
+    def test_list_orders_page_cpu_time(self):
+        orders = get_order_orms(500)
+        timings = {}
+        for name, serialize in [("pydantic", pydantic_page), ("fast", fast_page)]:
+            serialize(orders)  # warm up
+            start_time = time.process_time()
+            for _ in range(10):
+                serialize(orders)
+            timings[name] = (time.process_time() - start_time) / 10
+
+        print(f"500 order page: pydantic {timings['pydantic'] * 1000:.1f}ms, fast {timings['fast'] * 1000:.1f}ms")
+        assert json.loads(pydantic_page(orders)) == json.loads(fast_page(orders))
+        assert timings["fast"] < timings["pydantic"]
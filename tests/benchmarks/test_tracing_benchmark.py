@@ -0,0 +1,66 @@
+import time
+
+import pytest
+from httpx import AsyncClient
+from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.sdk.trace.sampling import Decision
+
+from app.config.tracing_config import build_tracer_provider, excluded_urls
+from app.main import create_application
+from app.utils.trace_sampler import RouteRatioSampler
+from tests.integrations.test_order_controller import get_address_dict, get_order_dict
+
+pytestmark = pytest.mark.benchmark
+
+
+async def time_requests(application, path, runs=300):
+    async with AsyncClient(app=application, base_url="http://test") as client:
+        await client.get(path)  # warm up
+        start_time = time.perf_counter()
+        for _ in range(runs):
+            await client.get(path)
+        return (time.perf_counter() - start_time) / runs
+
+
+def traced_application(sample_ratio):
+    exporter = InMemorySpanExporter()
+    provider = build_tracer_provider(exporter, sample_ratio)
+    application = create_application()
+    FastAPIInstrumentor.instrument_app(application, tracer_provider=provider,
+                                       excluded_urls=excluded_urls(["/", "/health", "/metrics"]))
+    return application, provider, exporter
+
+
+class TestTracingBenchmark:
+    async def test_request_overhead(self, async_client: AsyncClient):
+        await async_client.post("/order", json=get_order_dict(get_address_dict()))
+        sampled, sampled_provider, sampled_spans = traced_application(.1)
+        full, full_provider, full_spans = traced_application(1)
+
+        off_time = await time_requests(create_application(), "/order/1")
+        sampled_time = await time_requests(sampled, "/order/1")
+        full_time = await time_requests(full, "/order/1")
+        await time_requests(full, "/health", runs=10)
+        sampled_provider.force_flush()
+        full_provider.force_flush()
+
+        sampled_traces = {span.context.trace_id for span in sampled_spans.get_finished_spans()}
+        full_traces = {span.context.trace_id for span in full_spans.get_finished_spans()}
+        print(f"GET /order/1: tracing off {off_time * 1e6:.0f}us, sampled 10% {sampled_time * 1e6:.0f}us "
+              f"({len(sampled_traces)} traces), always on {full_time * 1e6:.0f}us ({len(full_traces)} traces)")
+        assert len(full_traces) == 301
+        assert 0 < len(sampled_traces) < 100
+        assert not [span for span in full_spans.get_finished_spans() if span.attributes.get("http.target") == "/health"]
+        sampled_provider.shutdown()
+        full_provider.shutdown()
+
+    def test_route_ratio_sampler(self):
+        sampler = RouteRatioSampler(0, {"/orders": 0, "/orders/export": 1})
+
+        def sampled(path):
+            return sampler.should_sample(None, 2 ** 64 - 1, "GET", attributes={"http.target": path}).decision
+
+        assert sampled("/orders/export") == Decision.RECORD_AND_SAMPLE
+        assert sampled("/orders") == Decision.DROP
+        assert sampled("/order/1") == Decision.DROP
@@ -10,6 +10,7 @@ import pytest_asyncio
 from fastapi import FastAPI
 from httpx import AsyncClient
 
+from app.config.settings import get_settings
 from app.main import create_application
 from app.utils import db_session
 
@@ -21,6 +22,13 @@ def app() -> FastAPI:
 
 @pytest_asyncio.fixture
 async def async_client(app: FastAPI) -> AsyncClient:
+    """
+    The client doesn't run the startup event, so the first connection is made here the way startup makes it.
+    Every test disposes the engine (see run_migrations), and the pool SQLAlchemy recreates on dispose guards its
+    first connect with a threading lock instead of an asyncio one. Two coroutines opening that first connection
+    at once then block the event loop thread for good. Startup pings before anything runs concurrently.
+    """
+    await db_session.wait_until_ready(get_settings().db_retry_window_seconds)
     async with AsyncClient(app=app, base_url='http://test') as client:
         yield client
 
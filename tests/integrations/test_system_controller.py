@@ -1,4 +1,12 @@
+import time
+
+import pytest
 from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config.settings import get_database_settings, DatabaseSettings
+from app.repository.order_repository import OrderRepository
+from app.utils import db_session
 
 
 class TestSettingController:
@@ -13,3 +21,75 @@ class TestSettingController:
 
         assert response.status_code == 200
         assert response.json() == {"fast-api-docker-poetry": 200}
+
+    async def test_pool_stats(self, async_client: AsyncClient) -> None:
+        await async_client.get("/orders")
+
+        response = await async_client.get("/health/pool")
+
+        assert response.status_code == 200
+        assert response.json()["checked_out"] == 0
+        assert response.json()["checkout_wait_seconds"]["count"] > 0
+
+    async def test_startup_warm_up(self, async_client: AsyncClient) -> None:
+        await db_session.wait_until_ready(1)
+        await db_session.warm_up(OrderRepository().warm_up_statements())
+
+        response = await async_client.get("/health/pool")
+
+        assert response.json()["checked_in"] == get_database_settings().pool_size
+        assert response.json()["checked_out"] == 0
+
+    async def test_startup_warm_up_replica_down(self, async_client: AsyncClient, monkeypatch) -> None:
+        down_replica = create_async_engine(get_database_settings().async_url.replace(":5432/", ":1/"))
+        monkeypatch.setattr(db_session.replicas, "engines", [down_replica])
+        monkeypatch.setattr(db_session.replicas, "_down_until", {})
+
+        try:
+            await db_session.warm_up(OrderRepository().warm_up_statements())
+        finally:
+            await down_replica.dispose()
+
+        assert down_replica in db_session.replicas._down_until
+        assert db_session.replicas.candidates() == []
+        response = await async_client.get("/orders")
+        assert response.status_code == 200
+
+    async def test_startup_retries_within_window(self, monkeypatch) -> None:
+        unreachable = create_async_engine(get_database_settings().async_url.replace(":5432/", ":1/"))
+        monkeypatch.setattr(db_session, "engine", unreachable)
+        start_time = time.perf_counter()
+
+        with pytest.raises(OSError):
+            await db_session.wait_until_ready(.5)
+
+        assert time.perf_counter() - start_time >= .5
+        await unreachable.dispose()
+
+    def test_worker_pool_limits(self) -> None:
+        database_settings = DatabaseSettings(pool_size=5, max_overflow=10, max_connections=100, reserved_connections=10)
+
+        assert DatabaseSettings(pool_size=5, max_overflow=10, max_connections=None).worker_pool_limits(16) == (5, 10)
+        assert DatabaseSettings(pool_size=5, max_overflow=10).worker_pool_limits(16) == (5, 0)
+        assert database_settings.worker_pool_limits(4) == (5, 10)
+        assert database_settings.worker_pool_limits(16) == (5, 0)
+        assert database_settings.worker_pool_limits(30) == (3, 0)
+        assert database_settings.worker_pool_limits(90) == (1, 0)
+        with pytest.raises(ValueError):
+            database_settings.worker_pool_limits(91)
+
+    async def test_metrics(self, async_client: AsyncClient) -> None:
+        await async_client.get("/orders")
+        await async_client.get("/not-a-route")
+
+        response = await async_client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        lines = response.text.splitlines()
+        assert "# TYPE http_request_duration_seconds histogram" in lines
+        assert [line for line in lines if line.startswith('http_request_duration_seconds_count{operation_id="list_orders_get"}')]
+        assert [line for line in lines if line.startswith('http_request_duration_seconds_bucket{operation_id="unmatched",le="+Inf"}')]
+        assert "http_requests_in_flight 1.0" in lines
+        assert [line for line in lines if line.startswith('db_query_duration_seconds_count{database="primary"}')]
+        assert 'db_pool_connections{database="primary",state="checked_out"} 0' in lines